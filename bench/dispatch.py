@@ -0,0 +1,61 @@
+"""Time normal mode key dispatch: pending prefixes, motions and ex commands,
+each key going through Editor.dispatch like it does from the browser.
+
+    python -m bench.dispatch
+    python -m bench.dispatch --repeat 2000
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from prompt_toolkit.key_binding.key_processor import KeyPress
+from prompt_toolkit.keys import Keys
+
+from piwrite.buffer import Buffer
+from piwrite.editor import Editor
+from piwrite.line import Line
+
+ENTER = Keys.ControlM
+
+TRACES = {
+    "prefixes": ["d", "x", "c", "x", "g", "x", "d", "i", "x", "c", "a", "x"],
+    "motions": ["g", "g", "G", "g", "g", "G"],
+    "status": [Keys.ControlS] * 6,
+    "ex typing": list(":fontsize 12") + [ENTER],
+    "ex late": list(":viz 30:15") + [ENTER] + list(":viz") + [ENTER],
+}
+
+
+def per_key(v, trace, repeat):
+    """Median microseconds per key of the trace"""
+    presses = [KeyPress(key) for key in trace]
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for press in presses:
+            v.dispatch(press)
+        times.append((time.perf_counter() - start) / len(presses))
+        v.updating_fields.clear()
+    return statistics.median(times) * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as docs:
+        v = Editor(docs=Path(docs), hardware=False)
+        v.buffer = Buffer([Line(f"Line {idx} of the document") for idx in range(500)])
+        v.history.reset(v.buffer)
+        print(f"{'trace':<12} {'keys':>5} {'us/key':>8}")
+        for name, trace in TRACES.items():
+            micro = per_key(v, trace, args.repeat)
+            print(f"{name:<12} {len(trace):>5} {micro:>8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
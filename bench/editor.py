@@ -0,0 +1,183 @@
+"""Replay key traces through the editor core and time every key.
+
+Synthetic documents of several sizes (short or very long paragraphs) are
+loaded into an Editor, and key traces are replayed through Editor.dispatch
+followed by Editor.get, like the server does for every frame. Reports per key
+latency percentiles and memory allocated per key.
+
+    python -m bench.editor                          # human readable table
+    python -m bench.editor --json results.json      # also save the results
+    python -m bench.editor --baseline results.json  # flag regressions
+
+Traces are lists of key names, as sent by the browser (see parse_key), and
+can also be recorded ones loaded from a JSON file with --trace.
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from piwrite.buffer import Buffer
+from piwrite.cursor import Cursor
+from piwrite.editor import Editor
+from piwrite.line import Line
+from piwrite.session import parse_key
+
+WORDS = (
+    "the of and to in is was he for it with as his on be at by had are but from "
+    "or have an they which one you were her all she there would their we him "
+    "been has when who will more no if out so said what up its about into than "
+    "them can only other new some could time these two may then do first any "
+    "manuscript paragraph chapter morning window garden letter silence river"
+).split()
+
+PARAGRAPHS = {"short": 60, "long": 3000}
+
+SENTENCE = list("The quick brown fox jumps over the lazy dog, again and again. ")
+
+TRACES = {
+    "typing": ["i"] + SENTENCE * 3 + ["c-m"] + SENTENCE + ["escape"],
+    "backspace": ["A"] + ["c-h"] * 40 + ["escape"],
+    "navigation": ["up"] * 40 + ["down"] * 40 + ["c-e", "c-a"] * 10,
+    "commands": ["d", "a", "w", "p", "d", "i", "w", "P", "d", "d", "u", "c-r"] * 3,
+}
+
+
+def document(lines, paragraph, seed=42):
+    """A deterministic synthetic document"""
+    rnd = random.Random(seed)
+    result = []
+    for idx in range(lines):
+        if idx % 10 == 9:
+            result.append("")
+            continue
+        words = []
+        length = 0
+        while length < paragraph:
+            word = rnd.choice(WORDS)
+            words.append(word)
+            length += len(word) + 1
+        result.append(" ".join(words))
+    return result
+
+
+def editor_with(lines, docs):
+    v = Editor(docs=docs, hardware=False)
+    v.buffer = Buffer([Line(line) for line in lines])
+    v.history.reset(v.buffer)
+    # Edit in the middle, where neither end of the document helps
+    v.cursor = Cursor(len(lines) // 2, 0)
+    return v
+
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(pct / 100 * len(values)))]
+
+
+def replay(lines, trace, docs, repeat):
+    timings = []
+    for _ in range(repeat):
+        v = editor_with(lines, docs)
+        for name in trace:
+            key_press = parse_key(name)
+            start = time.perf_counter()
+            v.dispatch(key_press)
+            v.get()
+            timings.append(time.perf_counter() - start)
+    # Allocations are measured on a separate pass, tracemalloc is slow
+    v = editor_with(lines, docs)
+    allocated = []
+    tracemalloc.start()
+    for name in trace:
+        key_press = parse_key(name)
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        v.dispatch(key_press)
+        v.get()
+        _, peak = tracemalloc.get_traced_memory()
+        allocated.append(peak - before)
+    tracemalloc.stop()
+    timings.sort()
+    return {
+        "keys": len(timings),
+        "p50_us": 1e6 * percentile(timings, 50),
+        "p95_us": 1e6 * percentile(timings, 95),
+        "p99_us": 1e6 * percentile(timings, 99),
+        "max_us": 1e6 * timings[-1],
+        "alloc_kib": statistics.mean(allocated) / 1024,
+    }
+
+
+def compare(results, baseline, threshold, floor_us=5):
+    """Scenarios and metrics that got worse than threshold (a fraction) against baseline"""
+    regressions = []
+    for scenario, result in results.items():
+        old = baseline.get(scenario)
+        if old is None:
+            continue
+        for metric in ["p50_us", "p95_us", "alloc_kib"]:
+            before, after = old[metric], result[metric]
+            if metric.endswith("_us") and after - before < floor_us:
+                continue
+            if after > before * (1 + threshold):
+                regressions.append((scenario, metric, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument(
+        "--paragraphs", nargs="+", choices=list(PARAGRAPHS), default=list(PARAGRAPHS)
+    )
+    parser.add_argument("--traces", nargs="+", choices=list(TRACES), default=None)
+    parser.add_argument("--trace", type=Path, help="JSON file with a recorded trace")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", type=Path, help="Write the results to this file")
+    parser.add_argument("--baseline", type=Path, help="Results to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Relative slowdown flagged as a regression (default 0.2, 20%%)",
+    )
+    args = parser.parse_args()
+    traces = {name: TRACES[name] for name in args.traces or TRACES}
+    if args.trace is not None:
+        traces[args.trace.stem] = json.loads(args.trace.read_text())
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for paragraph in args.paragraphs:
+            for size in args.sizes:
+                lines = document(size, PARAGRAPHS[paragraph])
+                for name, trace in traces.items():
+                    scenario = f"{name}/{size}/{paragraph}"
+                    result = replay(lines, trace, Path(tmp), args.repeat)
+                    results[scenario] = result
+                    print(
+                        f"{scenario:32s} p50 {result['p50_us']:9.1f}us "
+                        f"p95 {result['p95_us']:9.1f}us p99 {result['p99_us']:9.1f}us "
+                        f"alloc {result['alloc_kib']:9.1f}KiB/key",
+                        file=sys.stderr,
+                    )
+    if args.json is not None:
+        args.json.write_text(json.dumps({"results": results}, indent=2))
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text())["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for scenario, metric, before, after in regressions:
+            print(
+                f"REGRESSION {scenario} {metric}: {before:.1f} -> {after:.1f}",
+                file=sys.stderr,
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
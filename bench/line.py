@@ -0,0 +1,71 @@
+"""Time typing and deleting in the middle of long paragraphs.
+
+Compares Line with the plain string rebuilding it used to do on every key,
+reading the line back every few keys like the frames do.
+
+    python -m bench.line
+    python -m bench.line --lengths 1000 100000 --keys 2000 --every 1
+"""
+import argparse
+import sys
+import time
+
+from piwrite.line import Line
+
+
+class StringLine:
+    """Line as it was, copying the whole string on every key"""
+
+    def __init__(self, contents):
+        self.contents = contents
+
+    def __repr__(self):
+        return self.contents
+
+    def insert(self, column, letter):
+        s = self.contents
+        self.contents = s[0:column] + letter + s[column:]
+
+    def delete(self, column):
+        s = self.contents
+        self.contents = s[0 : column - 1] + s[column:]
+
+
+def run(line, keys, every):
+    """Seconds per key typing, then deleting as much, from the middle"""
+    column = len(str(line)) // 2
+    start = time.perf_counter()
+    for idx in range(keys):
+        line.insert(column, "a")
+        column += 1
+        if idx % every == 0:
+            str(line)
+    for idx in range(keys):
+        line.delete(column)
+        column -= 1
+        if idx % every == 0:
+            str(line)
+    return (time.perf_counter() - start) / (2 * keys)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--lengths", type=int, nargs="+", default=[3000, 30000, 300000])
+    parser.add_argument("--keys", type=int, default=5000)
+    parser.add_argument(
+        "--every", type=int, default=5, help="Read the line back every this many keys"
+    )
+    args = parser.parse_args()
+    for length in args.lengths:
+        text = "word " * (length // 5)
+        string = run(StringLine(text), args.keys, args.every)
+        gap = run(Line(text), args.keys, args.every)
+        print(
+            f"{length:8d} chars  string {1e6 * string:8.2f}us/key  "
+            f"gap {1e6 * gap:8.2f}us/key  ({string / gap:.1f}x)",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Drive a real PiWrite server with simulated long-polling clients.
+
+Starts the server (or uses --url to target one already running), connects a
+writer typing into a session at a steady pace and a number of viewers that,
+like a Kindle, only use HTTP long-polling, apply every frame and acknowledge
+it. Reports the time from key press to the frame showing it, the payload
+bytes per key and any frames lost, repeated or coalesced on the way.
+
+    python -m bench.loadgen --viewers 1 4 16 --seconds 10
+    python -m bench.loadgen --url http://piwrite.local --viewers 4
+
+Keys go to a named session (see get_session in the server), so the editor on
+the device itself is left alone. All runs share it, to stay clear of the
+limit on sessions of a long running server.
+"""
+import argparse
+import asyncio
+import json
+import os
+import pty
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import socketio
+
+from piwrite.frames import apply_diff
+
+TEXT = (
+    "It was a bright cold day in April, and the clocks were striking thirteen. "
+    "Winston Smith, his chin nuzzled into his breast in an effort to escape "
+    "the vile wind, slipped quickly through the glass doors of Victory Mansions."
+)
+
+
+class LoadClient:
+    """A polling client keeping the buffer up to date like index.js does"""
+
+    def __init__(self, url, session, sent, delay=0):
+        self.url = f"{url}?session={session}"
+        self.sent = sent  # Time each key was sent, shared with the writer
+        self.delay = delay
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.sio.on("frame", self.frame)
+        self.lines = None
+        self.version = 0
+        self.keys = 0
+        self.offset = 0  # Keys the session had seen before this run
+        self.frames = 0
+        self.bytes = 0
+        self.duplicated = 0
+        self.coalesced = 0
+        self.broken = 0
+        self.latencies = []
+
+    async def connect(self):
+        await self.sio.connect(self.url, transports=["polling"])
+
+    async def frame(self, e):
+        now = time.perf_counter()
+        self.frames += 1
+        self.bytes += len(json.dumps(e))
+        if e["v"] <= self.version:
+            self.duplicated += 1
+        elif self.version and e["v"] > self.version + 1:
+            self.coalesced += e["v"] - self.version - 1
+        self.version = max(self.version, e["v"])
+        if "data" in e:
+            self.lines = list(e["data"])
+        elif self.lines is None:
+            self.broken += 1  # A diff against nothing, the server lost track
+        else:
+            apply_diff(self.lines, e["ops"])
+        keys = e.get("k", self.keys + self.offset) - self.offset
+        for idx in range(self.keys, min(keys, len(self.sent))):
+            self.latencies.append(now - self.sent[idx])
+        self.keys = max(self.keys, keys)
+        if self.delay:
+            # Slow clients take a while to paint before acknowledging
+            await asyncio.sleep(self.delay)
+        await self.sio.emit("ack", e["v"])
+
+
+async def wait_for_server(url, timeout=30):
+    end = time.perf_counter() + timeout
+    async with aiohttp.ClientSession() as http:
+        while True:
+            try:
+                async with http.get(url) as response:
+                    response.raise_for_status()
+                    return
+            except aiohttp.ClientError:
+                if time.perf_counter() > end:
+                    raise
+                await asyncio.sleep(0.5)
+
+
+async def disconnect(clients, timeout=2):
+    # A polling client only notices it is disconnecting when its poll returns
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(*[client.sio.disconnect() for client in clients]), timeout
+        )
+    except asyncio.TimeoutError:
+        pass
+
+
+def start_server(port, home, fps):
+    # The default session reads keys from the terminal, give it one
+    _, slave = pty.openpty()
+    env = dict(os.environ, HOME=home, PIWRITE_PORT=str(port), PIWRITE_MAX_FPS=str(fps))
+    return subprocess.Popen(
+        [sys.executable, "-m", "piwrite"],
+        stdin=slave,
+        stdout=slave,
+        stderr=subprocess.DEVNULL,
+        env=env,
+    )
+
+
+async def run(count, args):
+    sent = []
+    writer = LoadClient(args.url, args.session, sent)
+    viewers = [
+        LoadClient(args.url, args.session, sent, args.client_delay / 1000)
+        for _ in range(count)
+    ]
+    for client in [writer] + viewers:
+        await client.connect()
+    # Wait for the snapshot sent on connect, the session may be in use already
+    await asyncio.sleep(1)
+    for client in [writer] + viewers:
+        client.offset, client.keys = client.offset + client.keys, 0
+    await writer.sio.emit("key", "i")
+    sent.append(time.perf_counter())
+    end = time.perf_counter() + args.seconds
+    idx = 0
+    while time.perf_counter() < end:
+        letter = TEXT[idx % len(TEXT)]
+        idx += 1
+        sent.append(time.perf_counter())
+        await writer.sio.emit("key", "c-m" if idx % len(TEXT) == 0 else letter)
+        await asyncio.sleep(1 / args.keys_per_second)
+    await asyncio.sleep(args.settle)
+    await disconnect([writer] + viewers)
+    latencies = sorted(lat for viewer in viewers for lat in viewer.latencies)
+    return {
+        "viewers": count,
+        "keys": len(sent),
+        "frames": sum(viewer.frames for viewer in viewers),
+        "p50_ms": 1000 * statistics.median(latencies),
+        "p95_ms": 1000 * latencies[int(0.95 * (len(latencies) - 1))],
+        "max_ms": 1000 * latencies[-1],
+        "bytes_per_key": sum(viewer.bytes for viewer in viewers) / len(sent) / count,
+        # Keys never shown by the time everything settled
+        "dropped": sum(len(sent) - viewer.keys for viewer in viewers),
+        "duplicated": sum(viewer.duplicated for viewer in viewers),
+        "coalesced": sum(viewer.coalesced for viewer in viewers),
+        "broken": sum(viewer.broken for viewer in viewers),
+        "diverged": sum(viewer.lines != writer.lines for viewer in viewers),
+    }
+
+
+async def run_all(args):
+    server = None
+    if args.url is None:
+        home = tempfile.mkdtemp()
+        server = start_server(args.port, home, args.fps)
+        args.url = f"http://127.0.0.1:{args.port}"
+    try:
+        await wait_for_server(args.url)
+        return [await run(count, args) for count in args.viewers]
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--url", help="Server to test, instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--session", default="loadgen", help="Session to type into")
+    parser.add_argument("--viewers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--keys-per-second", type=float, default=6)
+    parser.add_argument(
+        "--client-delay",
+        type=float,
+        default=0,
+        help="Milliseconds each viewer takes to paint a frame before acknowledging",
+    )
+    parser.add_argument("--fps", type=float, default=10, help="For the started server")
+    parser.add_argument(
+        "--settle", type=float, default=3, help="Seconds to wait for the last frames"
+    )
+    parser.add_argument("--json", action="store_true", help="Machine readable output")
+    args = parser.parse_args()
+    results = asyncio.run(run_all(args))
+    if args.json:
+        print(json.dumps({"results": results}))
+        return
+    for result in results:
+        print(
+            f"{result['viewers']:4d} viewers: latency p50 {result['p50_ms']:6.1f}ms "
+            f"p95 {result['p95_ms']:6.1f}ms max {result['max_ms']:6.1f}ms, "
+            f"{result['bytes_per_key']:7.1f} bytes/key, {result['frames']} frames, "
+            f"dropped {result['dropped']} keys, duplicated {result['duplicated']}, "
+            f"coalesced {result['coalesced']}, broken {result['broken']}, "
+            f"diverged {result['diverged']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Time the inline Markdown of long paragraphs: the single scan in
+markdownify.inline against the chained regex passes it replaced.
+
+    python -m bench.markdown
+    python -m bench.markdown --lengths 100 3000 --repeat 200
+"""
+import argparse
+import random
+import re
+import sys
+import time
+
+from piwrite.markdownify import inline
+
+WORDS = "the of and to in is was he for it with as his on be at by had".split()
+STYLES = ["**{}**", "_{}_", "`{}`", "::{}::"] + ["{}"] * 30 + ["{}."] * 6
+
+
+def regex_passes(line, visible=True):
+    """How markdownify did it before, four passes of two substitutions each"""
+    for marker, tag, close in [
+        (r"\*\*", "<b>", "</b>"),
+        ("_", "<i>", "</i>"),
+        ("`", "<tt>", "</tt>"),
+        ("::", "<span class='highlight'>", "</span>"),
+    ]:
+        beg_of_word = re.compile(rf"(^|\s){marker}(\S)")
+        end_of_word = re.compile(rf"(\S){marker}($|\s|:|\.|\W)")
+        mark = marker.replace("\\", "") if visible else ""
+        line = re.sub(beg_of_word, f"\\1{tag}{mark}\\2", line)
+        line = re.sub(end_of_word, f"\\1{mark}{close}\\2", line)
+    return line
+
+
+def paragraph(length, rnd):
+    words = []
+    size = 0
+    while size < length:
+        word = rnd.choice(STYLES).format(rnd.choice(WORDS))
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+def per_line(fn, lines, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for line in lines:
+            fn(line)
+    return (time.perf_counter() - start) / (repeat * len(lines))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--lengths", type=int, nargs="+", default=[60, 600, 3000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    rnd = random.Random(42)
+    for length in args.lengths:
+        lines = [paragraph(length, rnd) for _ in range(20)]
+        old = per_line(regex_passes, lines, args.repeat)
+        new = per_line(inline, lines, args.repeat)
+        print(
+            f"{length:6d} chars  regex {1e6 * old:8.1f}us/line  "
+            f"scan {1e6 * new:8.1f}us/line  ({old / new:.1f}x)",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""How many editing sessions can this machine sustain at the same time?
+
+Runs growing numbers of sessions in process, each with a writer typing at a
+steady pace and a viewer acknowledging every frame, and measures the CPU load
+and the time from key press to the frame that contains it. Frames are encoded
+as JSON like socket.io would, but nothing goes through the network.
+
+    python -m bench.sessions --sessions 1 2 4 8 16 --seconds 10
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from prompt_toolkit.key_binding.key_processor import KeyPress
+from prompt_toolkit.keys import Keys
+
+from piwrite.editor import Editor
+from piwrite.session import Session
+
+TEXT = (
+    "It was a bright cold day in April, and the clocks were striking thirteen. "
+    "Winston Smith, his chin nuzzled into his breast in an effort to escape "
+    "the vile wind, slipped quickly through the glass doors of Victory Mansions."
+)
+
+
+class BenchSession(Session):
+    """A session that records when each key was typed and when it was shown"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.typed = []
+        self.latencies = []
+        self.rendered_at = 0
+        self.sent_bytes = 0
+
+    def render(self):
+        self.rendered_at = time.perf_counter()
+        super().render()
+
+    async def fake_emit(self, event, payload, to):
+        self.sent_bytes += len(json.dumps(payload)) * len(to)
+        now = time.perf_counter()
+        while self.typed and self.typed[0] <= self.rendered_at:
+            self.latencies.append(now - self.typed.pop(0))
+        for sid in to:
+            asyncio.get_running_loop().call_later(
+                0.005,
+                lambda sid=sid: asyncio.ensure_future(self.ack(sid, payload["v"])),
+            )
+
+
+async def writer(session, keys_per_second, seconds):
+    session.put(KeyPress("i"))
+    end = time.perf_counter() + seconds
+    idx = 0
+    while time.perf_counter() < end:
+        letter = TEXT[idx % len(TEXT)]
+        idx += 1
+        session.typed.append(time.perf_counter())
+        if idx % len(TEXT) == 0:
+            session.put(KeyPress(Keys.ControlM))
+        else:
+            session.put(KeyPress(letter))
+        await asyncio.sleep(1 / keys_per_second)
+
+
+async def run(count, args, root):
+    sessions = []
+    for i in range(count):
+        docs = root / f"s{count}-{i}"
+        docs.mkdir()
+        editor = Editor(docs=docs, hardware=False)
+        session = BenchSession(f"s{i}", editor, None, args.fps)
+        session.emit = session.fake_emit
+        await session.connect("viewer")
+        session.start()
+        sessions.append(session)
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    await asyncio.gather(
+        *[writer(session, args.keys_per_second, args.seconds) for session in sessions]
+    )
+    await asyncio.sleep(2 / args.fps)
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    for session in sessions:
+        session.task.cancel()
+    latencies = sorted(lat for session in sessions for lat in session.latencies)
+    return {
+        "sessions": count,
+        "cpu_load": cpu / wall,
+        "p50_ms": 1000 * statistics.median(latencies),
+        "p95_ms": 1000 * latencies[int(0.95 * (len(latencies) - 1))],
+        "bytes_per_key": sum(s.sent_bytes for s in sessions) / len(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--keys-per-second", type=float, default=6)
+    parser.add_argument("--fps", type=float, default=10)
+    parser.add_argument(
+        "--max-latency",
+        type=float,
+        default=250,
+        help="p95 key to frame latency (ms) above which the box is not keeping up",
+    )
+    parser.add_argument("--json", action="store_true", help="Machine readable output")
+    args = parser.parse_args()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.sessions:
+            result = asyncio.run(run(count, args, Path(tmp)))
+            result["sustained"] = (
+                result["p95_ms"] <= args.max_latency and result["cpu_load"] < 0.9
+            )
+            results.append(result)
+            if not args.json:
+                print(
+                    f"{count:4d} sessions: cpu {100 * result['cpu_load']:5.1f}%, "
+                    f"latency p50 {result['p50_ms']:6.1f}ms p95 {result['p95_ms']:6.1f}ms, "
+                    f"{result['bytes_per_key']:7.1f} bytes/key"
+                )
+    sustained = [r["sessions"] for r in results if r["sustained"]]
+    if args.json:
+        print(
+            json.dumps({"results": results, "max_sessions": max(sustained, default=0)})
+        )
+    else:
+        print(f"Sustained up to {max(sustained, default=0)} sessions")
+
+
+if __name__ == "__main__":
+    main()
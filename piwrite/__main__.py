@@ -1,3 +1,5 @@
 import piwrite.server as server
 
-server.start()
+if __name__ == "__main__":
+    # Guarded, worker processes import this module again
+    server.start()
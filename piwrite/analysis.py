@@ -0,0 +1,25 @@
+"""Prose linting, with its heavy library imported on first use instead of when
+the server boots"""
+import functools
+
+from piwrite import startup
+
+
+@functools.lru_cache(maxsize=None)
+def _proselint():
+    from proselint import config, tools
+
+    return config, tools
+
+
+def lint(text):
+    config, tools = _proselint()
+    return tools.lint(text, config=config.default)
+
+
+def warm():
+    """Import everything up front, meant to run in the background once the
+    server accepts connections so the first :lint is quick"""
+    with startup.step("warm analysis"):
+        _proselint()
+    startup.report()
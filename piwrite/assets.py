@@ -0,0 +1,124 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import re
+
+import aiohttp.web
+
+try:
+    import brotli
+except ImportError:
+    # Optional, and browsers only ask for it over https anyway
+    brotli = None
+
+logger = logging.getLogger("piwrite")
+
+# Hashed assets never change, the page refers to a new name when they do
+IMMUTABLE = "public, max-age=31536000, immutable"
+# The page and unhashed names can be cached, but have to be checked every time
+REVALIDATE = "no-cache"
+
+STATIC_URL = re.compile(r"/static/([\w.-]+)")
+# Text assets, processed last (in this order) since they refer to the others by name
+REFERRING = {".css": 1, ".js": 2, ".html": 3}
+# A compressed variant is only kept if it saves at least this much
+MIN_SAVING = 0.1
+
+
+class Asset:
+    """A static file held in memory, with its precompressed variants"""
+
+    def __init__(self, name, body):
+        self.name = name
+        self.body = body
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        stem, dot, suffix = name.rpartition(".")
+        self.hashed = f"{stem}.{self.digest}.{suffix}" if dot else name
+        self.content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.variants = {}
+        compressors = [("gzip", lambda b: gzip.compress(b, 9, mtime=0))]
+        if brotli is not None:
+            compressors.insert(0, ("br", brotli.compress))
+        for encoding, compress in compressors:
+            compressed = compress(body)
+            if len(compressed) < (1 - MIN_SAVING) * len(body):
+                self.variants[encoding] = compressed
+
+    def etag(self, encoding=None):
+        # Each encoding is a different representation, with its own strong ETag
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+    def encoding(self, accept):
+        accepted = {part.split(";")[0].strip() for part in accept.split(",")}
+        for encoding in self.variants:
+            if encoding in accepted:
+                return encoding
+        return None
+
+
+def matches(if_none_match, etag):
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+class Assets:
+    """All the files in the static folder, loaded and compressed once at startup.
+
+    The page and the stylesheet refer to the other files by content hashed
+    names, that clients can cache forever. The plain names still work, but
+    clients have to revalidate them."""
+
+    def __init__(self, folder):
+        self.by_name = {}
+        self.by_hashed = {}
+        files = [path for path in folder.iterdir() if path.is_file()]
+        for path in sorted(files, key=lambda path: REFERRING.get(path.suffix, 0)):
+            body = path.read_bytes()
+            if path.suffix in REFERRING:
+                body = STATIC_URL.sub(self._hashed_url, body.decode("utf-8")).encode(
+                    "utf-8"
+                )
+            asset = Asset(path.name, body)
+            self.by_name[asset.name] = asset
+            self.by_hashed[asset.hashed] = asset
+        size = sum(len(asset.body) for asset in self.by_name.values())
+        logger.info(f"Loaded {len(self.by_name)} static files ({size} bytes)")
+
+    def _hashed_url(self, match):
+        asset = self.by_name.get(match.group(1))
+        return match.group(0) if asset is None else f"/static/{asset.hashed}"
+
+    def respond(self, request, asset, cache_control):
+        encoding = asset.encoding(request.headers.get("Accept-Encoding", ""))
+        headers = {
+            "ETag": asset.etag(encoding),
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if matches(request.headers.get("If-None-Match", ""), headers["ETag"]):
+            return aiohttp.web.Response(status=304, headers=headers)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return aiohttp.web.Response(
+            body=asset.variants.get(encoding, asset.body),
+            content_type=asset.content_type,
+            charset="utf-8" if asset.content_type.startswith("text/") else None,
+            headers=headers,
+        )
+
+    def page(self, name):
+        """Handler for a page, always revalidated so it picks up new asset names"""
+
+        async def handler(request):
+            return self.respond(request, self.by_name[name], REVALIDATE)
+
+        return handler
+
+    async def static(self, request):
+        name = request.match_info["name"]
+        if name in self.by_hashed:
+            return self.respond(request, self.by_hashed[name], IMMUTABLE)
+        if name in self.by_name:
+            return self.respond(request, self.by_name[name], REVALIDATE)
+        raise aiohttp.web.HTTPNotFound()
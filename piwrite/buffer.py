@@ -4,18 +4,76 @@ from prompt_toolkit.keys import Keys
 
 from piwrite.cursor import Cursor
 from piwrite.line import Line
+from piwrite.rope import Rope
+
+# Markdown markers don't make words
+SEPARATORS = str.maketrans("*_#:", "    ")
+
+
+def count_words(text) -> int:
+    return len(str(text).translate(SEPARATORS).split())
+
+
+def separates(letter) -> bool:
+    """Whether letter (None past the ends of a line) is between words"""
+    return letter is None or letter.isspace() or letter in "*_#:"
 
 
 class Buffer:
+    """The lines of the document, keeping count of words and paragraphs.
+
+    Lines are kept in a Rope, so copies (for undo) share them: the buffer owns
+    the lines it is given, and copies a line that may be in another copy right
+    before it changes in place.
+    All changes go through its methods, so the counts are updated from what
+    changed without going over the document. version goes up on every change."""
+
     # TODO: move insertion to Line
-    def __init__(self, lines: Union[List[Line], None] = None):
-        if lines:
-            self.lines = lines
-        else:
-            self.lines = list()
+    def __init__(self, lines: Union[List[Line], Rope, None] = None):
+        self.lines = Rope(lines or [])
+        self.line_words = Rope([count_words(line) for line in self.lines])
+        self.words = sum(self.line_words)
+        # Paragraphs are the lines with some word
+        self.paragraphs = sum(1 for count in self.line_words if count > 0)
+        self.version = 0
+        # Lines only in this buffer, by id, that can change in place
+        self._owned = {id(line): line for line in self.lines}
 
     def copy(self):
-        return Buffer([line.copy() for line in self.lines])
+        new = Buffer.__new__(Buffer)
+        new.lines = self.lines
+        new.line_words = self.line_words
+        new.words = self.words
+        new.paragraphs = self.paragraphs
+        new.version = 0
+        new._owned = {}
+        # From now on both share all the lines
+        self._owned = {}
+        return new
+
+    def changed(self):
+        """The lines added or changed since the last copy"""
+        return self._owned.values()
+
+    def _own(self, row: int) -> Line:
+        """The line at row, copied first if it may be shared"""
+        line = self.lines[row]
+        if id(line) not in self._owned:
+            line = line.copy()
+            self.lines = self.lines.set(row, line)
+            self._owned[id(line)] = line
+        return line
+
+    def _count(self, row: int, count: int):
+        """Set the word count of the line at row"""
+        old = self.line_words[row]
+        self.line_words = self.line_words.set(row, count)
+        self.words += count - old
+        self.paragraphs += (count > 0) - (old > 0)
+        self.version += 1
+
+    def _recount(self, row: int):
+        self._count(row, count_words(self.lines[row]))
 
     def __len__(self):
         return len(self.lines)
@@ -24,23 +82,30 @@ class Buffer:
         return self.lines[key]
 
     def __setitem__(self, key: int, value: Line):
-        self.lines[key] = value
+        self.lines = self.lines.set(key, value)
+        self._owned[id(value)] = value
+        self._recount(key)
+
+    def __delitem__(self, key: int):
+        self._count(key, 0)
+        self.lines = self.lines.delete(key)
+        self.line_words = self.line_words.delete(key)
+
+    def insert_line(self, row: int, line: Line):
+        self.lines = self.lines.insert(row, line)
+        self._owned[id(line)] = line
+        self.line_words = self.line_words.insert(row, 0)
+        self._recount(row)
+
+    def append(self, line: Line):
+        self.insert_line(len(self.lines), line)
 
     def __repr__(self):
         joined = "|".join([str(l) for l in self.lines])
         return f"Buffer({joined})"
 
     def counts(self):
-        content = " ".join([str(lin) for lin in self.get()])
-        content = (
-            content.replace("*", " ")
-            .replace("_", " ")
-            .replace("#", " ")
-            .replace(":", " ")
-        )
-        words = len(content.split(" "))
-        pars = len([1 for lin in self.get() if len(str(lin).strip()) > 0])
-        return words, pars, content
+        return self.words, self.paragraphs
 
     def insert(self, key, cursor: Cursor):
         col: int = cursor.column
@@ -52,18 +117,32 @@ class Buffer:
             # Keep indentation
             prev = str(self.lines[current_line])
             indent = len(prev) - len(prev.lstrip())
-            self.lines[current_line] = Line(head)
+            self[current_line] = Line(head)
             if len(tail) == 0 and indent > 0:
-                self.lines.insert(current_line + 1, Line(" " * indent))
+                self.insert_line(current_line + 1, Line(" " * indent))
                 cursor.to(current_line + 1, indent)
             else:
-                self.lines.insert(current_line + 1, Line(tail))
+                self.insert_line(current_line + 1, Line(tail))
                 cursor.to(current_line + 1, 0)
             return
 
         if cursor.line + 1 > len(self.lines):
-            self.lines.append(Line())
-        self.lines[cursor.line].insert(col, key)
+            self.append(Line())
+        row = cursor.line
+        line = self._own(row)
+        if len(key) != 1:
+            line.insert(col, key)
+            self._recount(row)
+        else:
+            # Only the letters around can tell if a word starts, splits or grows
+            before = line[col - 1] if 0 < col <= len(line) else None
+            after = line[col] if col < len(line) else None
+            line.insert(col, key)
+            if separates(key):
+                delta = int(not separates(before) and not separates(after))
+            else:
+                delta = int(separates(before) and separates(after))
+            self._count(row, self.line_words[row] + delta)
         cursor += 1
 
     def clip(self, cursor: Cursor):
@@ -88,14 +167,23 @@ class Buffer:
             if row == 0:
                 return
             new_column = len(self.lines[row - 1])
-            self.lines[row - 1] += self.lines[row]
-            self.lines = self.lines[0:row] + self.lines[row + 1 :]
+            self[row - 1] = Line(str(self.lines[row - 1]) + str(self.lines[row]))
+            del self[row]
             cursor.line = row - 1
             cursor.column = new_column
             self.clip(cursor)
             return
-        lin = self.lines[cursor.line]
-        self.lines[cursor.line].delete(col)
+        lin = self._own(row)
+        letter = lin[col - 1]
+        before = lin[col - 2] if col >= 2 else None
+        after = lin[col] if col < len(lin) else None
+        lin.delete(col)
+        # The opposite of inserting letter between before and after
+        if separates(letter):
+            delta = -int(not separates(before) and not separates(after))
+        else:
+            delta = -int(separates(before) and separates(after))
+        self._count(row, self.line_words[row] + delta)
         cursor -= 1
 
     def get(self):
@@ -3,97 +3,170 @@
 # For _reasons_ I need to use a separate virtual environment for this
 
 import argparse
-
-import inky
-from inky import InkyPHAT
-from PIL import Image, ImageDraw, ImageFont
-
+import json
+import os
+import select
+import sys
 from pathlib import Path
 
 static = Path(__file__).parent / "static"
 
-inky_display = InkyPHAT("red")
-
-parser = argparse.ArgumentParser()
-parser.add_argument(
-    "--font",
-    "-f",
-    choices=["mono", "latex", "gyre", "serif", "sans"],
-    required=True,
-    help="Font",
-)
-parser.add_argument(
-    "--state", "-s", choices=["on", "off"], required=True, help="State (on, off)"
-)
-args, _ = parser.parse_known_args()
+# Palette indices, the same as inky.WHITE, inky.BLACK and inky.RED
+WHITE, BLACK, RED = 0, 1, 2
+# Resolution of the red InkyPHAT
+RESOLUTION = (212, 104)
+FONTS = ["mono", "latex", "gyre", "serif", "sans"]
 
 padding = 1
 
-inky_display.lut = "red_ht"
 
-img = Image.new("P", inky_display.resolution)
-draw = ImageDraw.Draw(img)
+def text_size(font, text):
+    # getsize is gone in Pillow 10
+    if hasattr(font, "getsize"):
+        return font.getsize(text)
+    _, _, right, bottom = font.getbbox(text)
+    return right, bottom
 
-# Load the fonts
 
-monoid = ImageFont.truetype(str(static / "monoid-bold.ttf"), 40)
-monoid_small = ImageFont.truetype(str(static / "monoid-bold.ttf"), 16)
-monoid_med = ImageFont.truetype(str(static / "monoid-bold.ttf"), 24)
-piwrite = "PiWrite"
+def draw(font_name, state, resolution=RESOLUTION):
+    """The status image, in palette mode with WHITE, BLACK and RED"""
+    from PIL import Image, ImageDraw, ImageFont
 
-font = monoid
-if args.font == "gyre":
-    font = ImageFont.truetype(str(static / "texgyreheros-bold.otf"), 50)
-if args.font == "latex":
-    font = ImageFont.truetype(str(static / "cmunbx.ttf"), 50)
-if args.font == "serif":
-    font = ImageFont.truetype(str(static / "ImFell.ttf"), 54)
+    img = Image.new("P", resolution)
+    draw = ImageDraw.Draw(img)
 
-power_color = inky_display.BLACK if args.state == "off" else inky_display.RED
-
-# Draw border
-for x in range(0, img.width):
-    for y in range(0, img.height):
-        if x < 4 or y < 3 or x > img.width - 5 or y > img.height - 5:
-            img.putpixel((x, y), power_color)
+    # Load the fonts
 
-pw_w, pw_h = font.getsize(piwrite)
-pw_x = int((inky_display.width - pw_w) / 2)
-pw_y = int((inky_display.height - pw_h) / 2) + padding
-draw.text((pw_x, pw_y), piwrite, inky_display.BLACK, font=font)
+    monoid = ImageFont.truetype(str(static / "monoid-bold.ttf"), 40)
+    monoid_small = ImageFont.truetype(str(static / "monoid-bold.ttf"), 16)
+    monoid_med = ImageFont.truetype(str(static / "monoid-bold.ttf"), 24)
+    piwrite = "PiWrite"
 
+    font = monoid
+    if font_name == "gyre":
+        font = ImageFont.truetype(str(static / "texgyreheros-bold.otf"), 50)
+    if font_name == "latex":
+        font = ImageFont.truetype(str(static / "cmunbx.ttf"), 50)
+    if font_name == "serif":
+        font = ImageFont.truetype(str(static / "ImFell.ttf"), 54)
 
-state = args.state.upper()
-s_w, s_h = monoid_small.getsize(state)
-s_x = pw_x + 20
-s_y = 3
-draw.text((s_x, s_y), state, inky_display.BLACK, font=monoid_small)
+    power_color = BLACK if state == "off" else RED
 
-draw.text((pw_x, 0), "•", power_color, font=monoid_med)
+    # Draw border
+    for x in range(0, img.width):
+        for y in range(0, img.height):
+            if x < 4 or y < 3 or x > img.width - 5 or y > img.height - 5:
+                img.putpixel((x, y), power_color)
 
-l_height = 4
+    pw_w, pw_h = text_size(font, piwrite)
+    pw_x = int((img.width - pw_w) / 2)
+    pw_y = int((img.height - pw_h) / 2) + padding
+    draw.text((pw_x, pw_y), piwrite, BLACK, font=font)
 
-lower = pw_y + pw_h + 6
+    state = state.upper()
+    s_x = pw_x + 20
+    s_y = 3
+    draw.text((s_x, s_y), state, BLACK, font=monoid_small)
 
-for y in range(lower, lower + l_height):
-    for x in range(pw_x, inky_display.width - pw_x):
-        img.putpixel((x, y), power_color)
+    draw.text((pw_x, 0), "•", power_color, font=monoid_med)
 
-upper = pw_y - 1
+    l_height = 4
 
-if args.font == "gyre":
-    upper += 13
-
-for y in range(upper - l_height, upper):
-    for x in range(pw_x, inky_display.width - pw_x):
-        img.putpixel((x, y), power_color)
+    lower = pw_y + pw_h + 6
 
+    for y in range(lower, lower + l_height):
+        for x in range(pw_x, img.width - pw_x):
+            img.putpixel((x, y), power_color)
 
-# I wasn't sure if it was working properly, so did this manually
+    upper = pw_y - 1
 
-colors = [inky.WHITE, inky.BLACK, inky.RED]
-for x in range(img.width):
-    for y in range(img.height):
-        inky_display.set_pixel(x, y, colors[img.getpixel((x, y))])
+    if font_name == "gyre":
+        upper += 13
 
-inky_display.show()
+    for y in range(upper - l_height, upper):
+        for x in range(pw_x, img.width - pw_x):
+            img.putpixel((x, y), power_color)
+    return img
+
+
+class Inky:
+    def __init__(self):
+        from inky import InkyPHAT
+
+        self.inky_display = InkyPHAT("red")
+        self.inky_display.lut = "red_ht"
+        self.resolution = self.inky_display.resolution
+
+    def show(self, img):
+        # I wasn't sure if it was working properly, so did this manually
+        for x in range(img.width):
+            for y in range(img.height):
+                self.inky_display.set_pixel(x, y, img.getpixel((x, y)))
+        self.inky_display.show()
+
+
+class Fake:
+    """Writes every drawing as a numbered PNG, for trying without the hardware"""
+
+    def __init__(self, folder):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.resolution = RESOLUTION
+        self.count = 0
+
+    def show(self, img):
+        img.putpalette([255, 255, 255, 0, 0, 0, 255, 0, 0])
+        self.count += 1
+        img.save(self.folder / f"display-{self.count:04d}.png")
+
+
+def requests(fd):
+    """The requests arriving at fd as JSON lines, skipping outdated ones.
+
+    Drawing takes seconds, and whatever arrived meanwhile only matters for its
+    latest request."""
+    buffer = b""
+    closed = False
+    while not closed:
+        # Only block when there is no complete request to draw
+        wait = b"\n" not in buffer
+        while wait or select.select([fd], [], [], 0)[0]:
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                closed = True
+                break
+            buffer += chunk
+            wait = b"\n" not in buffer
+        *lines, buffer = buffer.split(b"\n")
+        lines = [line for line in lines if line.strip()]
+        if lines:
+            yield json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--font", "-f", choices=FONTS, help="Font")
+    parser.add_argument("--state", "-s", choices=["on", "off"], help="State (on, off)")
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Keep running, drawing the requests read from stdin as JSON lines",
+    )
+    parser.add_argument("--fake", help="Write PNGs to this folder instead of the Inky")
+    args, _ = parser.parse_known_args()
+    if not args.serve and (args.font is None or args.state is None):
+        parser.error("--font and --state are required without --serve")
+    backend = Fake(args.fake) if args.fake else Inky()
+    if args.serve:
+        for request in requests(sys.stdin.fileno()):
+            try:
+                img = draw(request["font"], request["state"], backend.resolution)
+                backend.show(img)
+            except Exception as e:
+                print(f"Failed drawing {request}: {e}", file=sys.stderr)
+    else:
+        backend.show(draw(args.font, args.state, backend.resolution))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
+import asyncio
 import logging
-import subprocess
 import sys
 import tempfile
 import time
@@ -10,25 +10,43 @@ from pathlib import Path
 
 from prompt_toolkit.key_binding.key_processor import KeyPress
 from prompt_toolkit.keys import Keys
-from proselint import config as proselint_config
-from proselint import tools as proselint_tools
 
+from piwrite import jobs, startup
 from piwrite.dispatcher import Dispatcher
+from piwrite.jobs import Jobs
 from piwrite.line import Line
-from piwrite.markdownify import markdownify
+from piwrite.linter import Linter
+from piwrite.markdownify import RENDERS, markdownify, warm
 from piwrite.mode import Mode
+from piwrite.panel import Panel, display_command
+from piwrite.reader import Reader, page_size
+from piwrite.stats import Stats
 
 logger = logging.getLogger("piwrite")
 
+# Lines rendered ahead of time at once, while nothing else needs the loop
+WARM_CHUNK = 50
+# Keys turning pages in reading mode
+PAGE_KEYS = {
+    " ": 1,
+    Keys.Right: 1,
+    Keys.PageDown: 1,
+    "b": -1,
+    Keys.Left: -1,
+    Keys.PageUp: -1,
+}
+
 
 class Editor:
-    UNDO_DEPTH = 10
+    # Undo snapshots kept, None for as many as fit in the memory budget
+    UNDO_DEPTH = None
 
-    def __init__(self, skip_config=True):
+    def __init__(self, skip_config=True, docs=None, hardware=True):
+        """hardware is whether this editor drives the device itself: the display,
+        shutting down and opening files anywhere. docs is where documents live"""
         # TODO: Some could be properties
         # TODO: Some should be saved and restored on quit
         self.refresh = False
-        self._history_pointer = 0
         self._mode = Mode.NORMAL
         self._command = []
         self.yank = [""]
@@ -50,24 +68,48 @@ class Editor:
         self.font = "serif"
         self.fontsize = 12
         self.err = None
-        home = Path.home()
-        self.docs = home / "piwrite-docs/"
+        self.lints = ""
+        self.hardware = hardware
+        if docs is None:
+            home = Path.home()
+            docs = home / "piwrite-docs/"
+        self.docs = docs
+        # Where the server exposes docs
+        self.docs_url = "/docs"
+        # Temporary files the editor itself created, for :h, :lint and :dot
+        self.scratch = set()
         self.docs.mkdir(exist_ok=True)
         (self.docs / Path("imgs")).mkdir(exist_ok=True)
         self.dispatcher = Dispatcher(editor=self)
+        self.jobs = Jobs()
+        self.linter = Linter()
+        self.stats = Stats()
+        self.reader = Reader()
         config = self.docs / "config"
         if config.exists() and not skip_config:
-            lines = config.read_text()
-            for line in lines.split("\n"):
-                logger.debug("Sending config line %s", line)
-                self.send([line, Keys.ControlM])
+            with startup.step("config replay"):
+                lines = config.read_text()
+                for line in lines.split("\n"):
+                    logger.debug("Sending config line %s", line)
+                    self.send([line, Keys.ControlM])
             self.status = "Config loaded"
             self.updating_fields["status"] = True
-        try:
-            self._display = Path(__file__).parent / "display.py"
-            subprocess.call([self._display, "-f", self.font, "-s", "on"])
-        except:
-            pass
+        self.panel = Panel(display_command())
+        if self.hardware:
+            with startup.step("display.py"):
+                self.panel.show(self.font, "on")
+
+    def allowed(self, path):
+        """Whether this editor can open or write path"""
+        if self.hardware:
+            return True
+        resolved = Path(path).resolve()
+        if str(resolved) in self.scratch:
+            return True
+        if resolved == Path(__file__).parent.resolve() / "help":
+            return True
+        docs = self.docs.resolve()
+        return resolved == docs or docs in resolved.parents
 
     def send(self, arr):
         """Send an array containing strings and keys to be parsed"""
@@ -82,13 +124,89 @@ class Editor:
     def mode(self):
         return str(self._mode)
 
+    def words(self):
+        words = self.buffer.words
+        return f"{words} word{'s' if words != 1 else ''}"
+
+    def lint_idle(self, notify):
+        """Lint the paragraphs that changed, while the writer pauses"""
+        lines = [str(line) for line in self.buffer.lines]
+
+        def update():
+            if self.update_lints():
+                notify()
+
+        self.linter.refresh(lines, update)
+
+    def update_lints(self):
+        """Show the count of suggestions, returns whether it changed"""
+        count = self.linter.count
+        lints = "" if not count else f"{count} lint{'s' if count > 1 else ''}"
+        if lints == self.lints:
+            return False
+        self.lints = lints
+        self.updating_fields["lints"] = True
+        return True
+
+    def analyse(self, label, fn, args, done, check=None):
+        """Run a slow analysis in the background, with label in the modal meanwhile"""
+        self.modal = f"<i>{label}…</i>"
+        self.updating_fields["modal"] = True
+        self.jobs.submit(fn, args, done, check)
+
+    def warm_renders(self):
+        """Render a freshly opened document in the background, a chunk at a
+        time, so scrolling through it finds its lines already rendered"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        buffer = self.buffer
+
+        def step(start):
+            if self.buffer is not buffer or RENDERS.full():
+                return
+            warm(str(line) for line in buffer.lines[start : start + WARM_CHUNK])
+            if start + WARM_CHUNK < len(buffer):
+                loop.call_soon(step, start + WARM_CHUNK)
+
+        loop.call_soon(step, 0)
+
+    def read(self, page=None):
+        """Show a page of the document in reading mode, the one with the cursor
+        by default"""
+        self.reader.open(self.buffer, page_size(self.fontsize, self.rot))
+        if page is None:
+            page = self.reader.page_of(self.cursor.line)
+        self.visual = self.reader.page(page)
+        self.updating_fields["visual"] = True
+
+    def window(self):
+        """The rows of the buffer on screen, from the first to past the last"""
+        if self.viz:
+            viz = self.viz[0]
+            shift = self.viz[1]
+        else:
+            viz = int(1100 / (2 * self.fontsize)) + 2  # _very_ rough approx
+            shift = int(viz / 2)
+            if self.rot == "90":  # TODO: Convert these to an Enum
+                viz = int(int(self.fontsize) / 9)
+                shift = 2
+        row = self.cursor.line
+        start = 0 if row < viz else max(0, row - shift)
+        # Short lines take less than a screen row, so twice what fits
+        fit = int(1100 / (2 * int(self.fontsize))) + 2
+        return start, max(start + 2 * fit, row + 1)
+
     def get(self):
-        # TODO: needs a test
-        lines = [str(lin) for lin in self.buffer.get()]  # "cheap" copy
-        if self.cursor.line + 1 > len(lines):
+        first, last = self.window()
+        # Only what is on screen, so the cost doesn't grow with the document
+        lines = [str(lin) for lin in self.buffer.lines[first:last]]
+        row = self.cursor.line - first
+        if row + 1 > len(lines):
             lin = ""
             lines.append(lin)
-        lin = lines[self.cursor.line]
+        lin = lines[row]
         col = self.cursor.column
         # if col == 0:
         #    col = 1
@@ -102,15 +220,13 @@ class Editor:
             letter = lin[col - 1]
         if self._mode == Mode.INSERT:
             if False:  # col == 1:
-                lines[self.cursor.line] = (
-                    """<span id="ins0">""" + letter + """</span>""" + end
-                )
+                lines[row] = """<span id="ins0">""" + letter + """</span>""" + end
             else:
                 if col - 1 < 0:
                     start = ""
                 else:
                     start = lin[0 : col - 1]
-                lines[self.cursor.line] = (
+                lines[row] = (
                     start
                     + """<span id="caret" class="ins">"""
                     + letter
@@ -122,27 +238,14 @@ class Editor:
                 start = ""
             else:
                 start = lin[0 : col - 1]
-            lines[self.cursor.line] = (
+            lines[row] = (
                 start
                 + """<span id="caret" class="normal">"""
                 + letter
                 + """</span>"""
                 + end
             )
-        if self.viz:
-            viz = self.viz[0]
-            shift = self.viz[1]
-        else:
-            viz = int(1100 / (2 * self.fontsize)) + 2  # _very_ rough approx
-            shift = int(viz / 2)
-            if self.rot == "90":  # TODO: Convert these to an Enum
-                viz = int(int(self.fontsize) / 9)
-                shift = 2
-        row = self.cursor.line
-        if row < viz:
-            return markdownify(lines, row)
-        else:
-            return markdownify(lines[row - shift :], shift)
+        return markdownify(lines, row)
 
     def setup_movement(self):
         def up():
@@ -182,17 +285,9 @@ class Editor:
         key = _key.key
         if key == Keys.ControlC:
             self._break_counter += 1
-            if self._break_counter == 3:
-                subprocess.call(
-                    [
-                        self._display,
-                        "/home/ruben/display.py",
-                        "-f",
-                        self.font,
-                        "-s",
-                        "off",
-                    ]
-                )
+            if self._break_counter == 3 and self.hardware:
+                self.panel.show(self.font, "off")
+                self.panel.close()
                 sys.exit(0)
         else:
             self._break_counter = 0
@@ -200,18 +295,30 @@ class Editor:
             self.log_keys = False
             return
         if self.log_keys:
-            # TODO: move this appending to be a method on buffer
-            self.buffer.lines.append(Line(str(key)))
+            self.buffer.append(Line(str(key)))
             return
 
         if key == Keys.ControlP:
-            p_suggestions = proselint_tools.lint(
-                str(self.buffer.lines[self.cursor.line]),
-                config=proselint_config.default,
-            )
-            suggestions = [f"At {sug[3]}: {sug[1]}" for sug in p_suggestions]
-            self.modal = "<br>".join(suggestions)
-            self.updating_fields["modal"] = True
+            line = self.cursor.line
+
+            def paragraph():
+                lines = self.buffer.lines
+                return str(lines[line]) if line < len(lines) else None
+
+            def show(p_suggestions, error):
+                if error is not None:
+                    self.modal = str(error)
+                else:
+                    suggestions = [f"At {sug[3]}: {sug[1]}" for sug in p_suggestions]
+                    self.modal = "<br>".join(suggestions)
+                self.updating_fields["modal"] = True
+
+            self.analyse("Linting paragraph", jobs.lint, [paragraph()], show, paragraph)
+            return
+
+        reading = self.visual != "" and self._mode == Mode.NORMAL
+        if reading and not self._command and key in PAGE_KEYS:
+            self.read(self.reader.current + PAGE_KEYS[key])
             return
 
         if key in self.GENERIC_MOVEMENT:
@@ -225,6 +332,7 @@ class Editor:
 
         if key == Keys.Escape and self.modal != "":
             logger.info("Hiding modal")
+            self.jobs.cancel()
             self.modal = ""
             self.updating_fields["modal"] = True
             self.clear_command()
@@ -237,30 +345,19 @@ class Editor:
             self.clear_command()
             return
 
+        if self._mode == Mode.INSERT and self.jobs.pending():
+            # Whatever it was analysing is changing
+            self.jobs.cancel()
+            self.modal = ""
+            self.updating_fields["modal"] = True
+
         if self._mode == Mode.INSERT:
             if key == Keys.Escape:
                 self._mode = Mode.NORMAL
                 self.updating_fields["mode"] = True
                 self.cursor -= 1  # This seems to be the vim behaviour
                 self.buffer.clip(self.cursor)
-                logger.debug(
-                    "History before: %s, %s", self._history, self._history_pointer
-                )
-                # TODO: All this needs better testing, and it may get tricky
-                if self._history_pointer + 1 >= len(self._history):
-                    logger.debug("Adding at the end")
-                    self._history.append(self.buffer.copy())
-                else:
-                    self._history[self._history_pointer + 1] = self.buffer.copy()
-                self._history_pointer += 1
-                self._history_pointer = min(self._history_pointer, self.UNDO_DEPTH - 1)
-                logger.debug("Clipping pointer at %s", self._history_pointer)
-                if len(self._history) > self.UNDO_DEPTH:
-                    self._history = self._history[-self.UNDO_DEPTH :]
-                    assert len(self._history) == self.UNDO_DEPTH
-                logger.debug(
-                    "History after: %s, %s", self._history, self._history_pointer
-                )
+                self.history.record(self.buffer, self.UNDO_DEPTH)
                 return
             if self.saved:
                 self.updating_fields["saved"] = True
@@ -284,6 +381,10 @@ class Editor:
         self.updating_fields["status"] = True
         self._command = []
         self.updating_fields["command"] = True
+        # Errors are shown once, so the same error can be shown again later
+        if self.err is not None:
+            self.err = None
+            self.updating_fields["err"] = True
 
     def command(self):
         filt = [str(l) for l in self._command if len(str(l)) == 1]
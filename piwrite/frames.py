@@ -0,0 +1,103 @@
+from difflib import SequenceMatcher
+
+# Past this many differing lines it is cheaper to resend the block than to diff it
+MAX_DIFF_LINES = 200
+
+
+def line_diff(old, new):
+    """Compute the splices that turn the list of lines old into new.
+
+    Returns a list of [start, end, lines] operations, where old[start:end]
+    has to be replaced by lines. Indices always refer to old, so the operations
+    have to be applied from the last to the first (see apply_diff)."""
+    if old == new:
+        return []
+    prefix = 0
+    shortest = min(len(old), len(new))
+    while prefix < shortest and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while (
+        suffix < shortest - prefix
+        and old[len(old) - 1 - suffix] == new[len(new) - 1 - suffix]
+    ):
+        suffix += 1
+    old_mid = old[prefix : len(old) - suffix]
+    new_mid = new[prefix : len(new) - suffix]
+    if (
+        len(old_mid) <= 1
+        or len(new_mid) <= 1
+        or len(old_mid) > MAX_DIFF_LINES
+        or len(new_mid) > MAX_DIFF_LINES
+    ):
+        return [[prefix, prefix + len(old_mid), new_mid]]
+    ops = []
+    matcher = SequenceMatcher(None, old_mid, new_mid, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        ops.append([prefix + i1, prefix + i2, new_mid[j1:j2]])
+    return ops
+
+
+def apply_diff(lines, ops):
+    """Apply the operations from line_diff to a list of lines, in place"""
+    for start, end, replacement in reversed(ops):
+        lines[start:end] = replacement
+    return lines
+
+
+class Viewer:
+    """Delivery state of one connected client.
+
+    Only one frame is in flight per client at a time, until the client
+    acknowledges it. Frames rendered meanwhile replace the pending one (and
+    field updates are merged), so a slow client jumps straight to the latest
+    state instead of replaying all the intermediate ones."""
+
+    def __init__(self):
+        self.lines = None  # What the client is showing, None if it needs a full frame
+        self.fields = {}
+        self.pending = None
+        self.inflight = None
+
+    def offer(self, version, lines, fields, keys=None):
+        # keys is how many keys the frame reflects, for clients measuring latency
+        self.pending = (version, lines, keys)
+        self.fields.update(fields)
+
+    def ready(self, now, timeout):
+        if self.pending is None:
+            return False
+        # Clients that never acknowledge (like a stale cached page) still get frames
+        return self.inflight is None or now - self.inflight[1] > timeout
+
+    def group(self):
+        """Viewers in the same group would get exactly the same payload"""
+        # Several viewers can only share lines by having been sent the same frame
+        base = None if self.lines is None else id(self.lines)
+        return self.pending[0], base, frozenset(self.fields)
+
+    def take(self, now, payload=None):
+        """Pop the pending frame as the payload of a single frame event.
+
+        The payload already built for another viewer of the same group can be
+        passed to avoid diffing again"""
+        version, lines, keys = self.pending
+        self.pending = None
+        if payload is None:
+            payload = {"v": version, "fields": self.fields}
+            if keys is not None:
+                payload["k"] = keys
+            if self.lines is None:
+                payload["data"] = lines
+            else:
+                payload["ops"] = line_diff(self.lines, lines)
+        self.fields = {}
+        self.lines = lines
+        self.inflight = (version, now)
+        return payload
+
+    def ack(self, version):
+        if self.inflight is not None and version >= self.inflight[0]:
+            self.inflight = None
@@ -0,0 +1,94 @@
+"""Undo and redo, as snapshots of the buffer taken when leaving insert mode.
+
+Snapshots share every line that did not change (see Buffer.copy), so each
+one only costs what was edited since the previous. The oldest are forgotten
+once they add up to more than a memory budget. Before the oldest, undo goes
+on through the versions saved earlier, if the document has an UndoLog."""
+import logging
+import os
+
+from piwrite.buffer import Buffer
+from piwrite.line import Line
+
+logger = logging.getLogger("piwrite")
+
+BUDGET = int(os.getenv("PIWRITE_UNDO_MEMORY", 4 * 1024 * 1024))
+# Rough bytes of a line besides its text, and of a snapshot besides its lines
+LINE_BYTES = 100
+SNAPSHOT_BYTES = 2048
+
+
+class History:
+    def __init__(self, buffer=None, budget=BUDGET):
+        self.budget = budget
+        self.reset(Buffer() if buffer is None else buffer)
+
+    def reset(self, buffer, log=None):
+        """Start over from buffer. log is the UndoLog of the document, to go
+        back to older saved versions once these snapshots run out"""
+        self.snapshots = [buffer.copy()]
+        self.costs = [0]
+        self.pointer = 0
+        self.log = log
+
+    def cost(self, buffer):
+        """Estimated bytes only buffer holds, against the previous snapshot"""
+        return SNAPSHOT_BYTES + sum(len(line) + LINE_BYTES for line in buffer.changed())
+
+    def record(self, buffer, depth=None):
+        """Snapshot buffer after the current one, keeping at most depth of them
+        (None for as many as fit in the budget)"""
+        cost = self.cost(buffer)
+        snapshot = buffer.copy()
+        if self.pointer + 1 >= len(self.snapshots):
+            self.snapshots.append(snapshot)
+            self.costs.append(cost)
+        else:
+            self.snapshots[self.pointer + 1] = snapshot
+            self.costs[self.pointer + 1] = cost
+        self.pointer += 1
+        drop = 0
+        if depth is not None:
+            drop = max(0, len(self.snapshots) - depth)
+        total = sum(self.costs[drop:])
+        # The newest snapshot stays, whatever it costs
+        while total > self.budget and drop < len(self.snapshots) - 1:
+            total -= self.costs[drop]
+            drop += 1
+        if drop:
+            logger.debug("Forgetting the %s oldest undo snapshots", drop)
+            del self.snapshots[:drop]
+            del self.costs[:drop]
+            self.pointer = max(0, self.pointer - drop)
+
+    def older(self):
+        """Put the version saved before the oldest snapshot first, if known"""
+        if self.log is None:
+            return False
+        lines = [str(line) for line in self.snapshots[0]]
+        previous = self.log.previous(lines)
+        if previous is None:
+            return False
+        self.snapshots.insert(0, Buffer([Line(line) for line in previous]))
+        current = set(lines)
+        changed = sum(
+            len(line) + LINE_BYTES for line in previous if line not in current
+        )
+        self.costs[0] = SNAPSHOT_BYTES + changed
+        self.costs.insert(0, 0)
+        self.pointer += 1
+        return True
+
+    def undo(self):
+        """The previous buffer and whether there was one, else the oldest"""
+        if self.pointer == 0:
+            self.older()
+        moved = self.pointer > 0
+        self.pointer = max(0, self.pointer - 1)
+        return self.snapshots[self.pointer].copy(), moved
+
+    def redo(self):
+        """The next buffer and whether there was one, else the newest"""
+        moved = self.pointer + 1 < len(self.snapshots)
+        self.pointer = min(self.pointer + 1, len(self.snapshots) - 1)
+        return self.snapshots[self.pointer].copy(), moved
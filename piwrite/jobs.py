@@ -0,0 +1,92 @@
+"""Slow analyses (proselint, graphviz) run in a worker process,
+so typing never waits for them"""
+import asyncio
+import logging
+import multiprocessing
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+from piwrite import analysis
+
+logger = logging.getLogger("piwrite")
+
+_pool = None
+
+
+def pool():
+    """The worker pool, started on first use with the libraries already imported"""
+    global _pool
+    if _pool is None:
+        # spawn, forking a process running the server loop and threads is asking for trouble
+        context = multiprocessing.get_context("spawn")
+        _pool = ProcessPoolExecutor(1, context, initializer=analysis.warm)
+    return _pool
+
+
+def warm():
+    """Start the worker ahead of the first job"""
+    pool().submit(int)
+
+
+def lint(text):
+    return [tuple(suggestion) for suggestion in analysis.lint(text)]
+
+
+def dot(source, image):
+    return subprocess.call(["dot", "-Tpng", source, "-o", image])
+
+
+class StaleJob(Exception):
+    pass
+
+
+class Jobs:
+    """The analysis running for an editor, at most one at a time.
+
+    Results are only applied if the text they were computed from is still
+    there, and when there is no event loop (tests, replaying the config) jobs
+    just run inline."""
+
+    def __init__(self):
+        self.current = None
+        # Called after applying a result, so the clients get a new frame
+        self.notify = lambda: None
+
+    def submit(self, fn, args, done, check=None):
+        """Run fn(*args) and call done(result, error). check returns the text
+        the job depends on, if it changed by the time the result arrives error
+        is a StaleJob"""
+        self.cancel()
+        expected = None if check is None else check()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            try:
+                done(fn(*args), None)
+            except Exception as e:
+                done(None, e)
+            return
+        future = loop.run_in_executor(pool(), fn, *args)
+        self.current = future
+
+        def finished(future):
+            if future.cancelled() or self.current is not future:
+                return
+            self.current = None
+            if check is not None and check() != expected:
+                logger.info("Dropping the result of a stale job")
+                done(None, StaleJob("The text changed meanwhile, try again"))
+            else:
+                error = future.exception()
+                done(None if error else future.result(), error)
+            self.notify()
+
+        future.add_done_callback(finished)
+
+    def pending(self):
+        return self.current is not None
+
+    def cancel(self):
+        if self.current is not None:
+            self.current.cancel()
+            self.current = None
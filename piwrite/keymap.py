@@ -0,0 +1,37 @@
+"""Normal mode key sequences as a trie. Each key goes one level down, so
+finding a command costs the length of its sequence, and a node without a
+command is a prefix still waiting for more keys (d, di, g…)."""
+
+
+class Node:
+    __slots__ = ("children", "command")
+
+    def __init__(self):
+        self.children = {}
+        self.command = None
+
+
+class Keymap:
+    def __init__(self):
+        self.root = Node()
+
+    def add(self, keys, command):
+        """Run command when keys (a string or a list of keys) are typed"""
+        node = self.root
+        for key in keys:
+            child = node.children.get(key)
+            if child is None:
+                child = node.children[key] = Node()
+            node = child
+        if node.command is not None:
+            raise ValueError(f"{keys!r} is already bound")
+        node.command = command
+
+    def find(self, keys):
+        """The node keys lead to, None if no sequence starts with them"""
+        node = self.root
+        for key in keys:
+            node = node.children.get(key)
+            if node is None:
+                return None
+        return node
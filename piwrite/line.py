@@ -1,19 +1,63 @@
 class Line:
+    """A line (a paragraph, usually) with a gap buffer at the last edit.
+
+    Typing or deleting next to the previous edit only touches the gap, the
+    line is put back together as a string when something reads it."""
+
     def __init__(self, contents=None):
         if contents:
-            self.contents = contents
+            self._text = contents
         else:
-            self.contents = ""
+            self._text = ""
+        # Column of the gap, None when there is no gap
+        self._gap = None
         self.cursor = None
 
+    def _open(self, column):
+        """Move the gap to column"""
+        text = self.contents
+        # The line is head[: len(head) - cut] + typed + tail
+        self._head = text[0:column]
+        self._cut = 0
+        self._typed = []
+        self._tail = text[column:]
+        self._gap = column
+
+    @property
+    def contents(self):
+        if self._text is None:
+            self._head = self._head[0 : len(self._head) - self._cut] + "".join(
+                self._typed
+            )
+            self._cut = 0
+            self._typed = []
+            self._text = self._head + self._tail
+        return self._text
+
+    @contents.setter
+    def contents(self, value):
+        self._text = value
+        self._gap = None
+
     def copy(self):
         return Line(self.contents)
 
     def __getitem__(self, key):
-        return self.contents[key]
+        if self._text is not None or not isinstance(key, int):
+            return self.contents[key]
+        if key < 0:
+            key += len(self)
+        kept = len(self._head) - self._cut
+        if 0 <= key < kept:
+            return self._head[key]
+        if kept <= key < self._gap:
+            return self._typed[key - kept]
+        return self._tail[key - self._gap]
 
     def __len__(self):
-        return len(self.contents)
+        if self._text is None:
+            return self._gap + len(self._tail)
+        return len(self._text)
 
     def __repr__(self):
         return self.contents
@@ -25,23 +69,28 @@ class Line:
             return self.contents == other
 
     def __iadd__(self, other):
-        self.contents += other.contents
+        self.contents = self.contents + other.contents
         return self
 
     def delete(self, column):
-        s = self.contents
-        self.contents = s[0 : column - 1] + s[column:]
+        """Delete the letter before column"""
+        if column <= 0:
+            return
+        if self._gap != column:
+            self._open(column)
+        if self._typed:
+            self._typed.pop()
+        else:
+            self._cut += 1
+        self._gap -= 1
+        self._text = None
 
     def insert(self, column, letter):
-        s = self.contents
-        if len(self.contents) == column:
-            self.contents = s + letter
-        else:
-            # TODO: keep the breakage point and keep inserting until a change of cursor
-            # Probably needs to keep track of cursor, which I haven't used yet.
-            self.contents = (
-                s[0:column] + letter + s[column:]
-            )  # Wasteful, but ok for a PoC
+        if self._gap != column:
+            self._open(column)
+        self._typed.extend(letter)
+        self._gap += len(letter)
+        self._text = None
 
     def _iw(self):
         """Handle, kind of, the inside word text object. Returns the new cursor position"""
@@ -0,0 +1,166 @@
+"""Proselint suggestions for every paragraph, linted in the background while
+the writer pauses and cached by content, so only edited paragraphs are linted
+again. The cache is shared by every session of the server"""
+import hashlib
+import logging
+import weakref
+from collections import OrderedDict
+
+from piwrite import analysis
+from piwrite.jobs import Jobs
+
+logger = logging.getLogger("piwrite")
+
+# Paragraphs whose suggestions are kept, the least recently used go first. It
+# grows to hold every paragraph of the documents being linted if that is more
+CACHE_SIZE = 4096
+# Paragraphs linted per job, small enough to not hold up Ctrl-P or :stats
+BATCH = 16
+
+
+def clean(text):
+    # Markdown markers make proselint complain about nothing
+    return text.replace("*", " ").replace("_", " ").replace("#", " ").replace(":", " ")
+
+
+def lint_paragraphs(texts):
+    """Runs in the worker"""
+    return [
+        [tuple(suggestion) for suggestion in analysis.lint(clean(text))]
+        for text in texts
+    ]
+
+
+def key(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class Cache:
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        # Distinct paragraphs of the document each linter checked last, never
+        # evicted below their sum
+        self.documents = weakref.WeakKeyDictionary()
+
+    def __contains__(self, text):
+        return key(text) in self.entries
+
+    def get(self, text):
+        k = key(text)
+        if k not in self.entries:
+            return None
+        self.entries.move_to_end(k)
+        return self.entries[k]
+
+    def put(self, text, suggestions):
+        k = key(text)
+        self.entries[k] = suggestions
+        self.entries.move_to_end(k)
+        limit = max(self.size, sum(self.documents.values()))
+        while len(self.entries) > limit:
+            self.entries.popitem(last=False)
+
+
+CACHE = Cache()
+
+
+class Linter:
+    def __init__(self, size=None):
+        """size gives this linter a cache of its own, else it shares CACHE"""
+        self.cache = CACHE if size is None else Cache(size)
+        self.jobs = Jobs()
+        # Suggestions in the whole document, None until it has all been linted
+        self.count = None
+
+    def get(self, text):
+        return self.cache.get(text)
+
+    def put(self, text, suggestions):
+        self.cache.put(text, suggestions)
+
+    def missing(self, lines):
+        """Paragraphs not linted yet, each only once"""
+        paragraphs = {line for line in lines if line.strip()}
+        self.cache.documents[self] = len(paragraphs)
+        result = {}
+        for line in lines:
+            if line in paragraphs and line not in self.cache:
+                result[line] = True
+        return list(result)
+
+    def known(self, lines):
+        """The cached suggestions of the paragraphs in lines"""
+        result = {}
+        for line in lines:
+            if line.strip() and line not in result:
+                cached = self.get(line)
+                if cached is not None:
+                    result[line] = cached
+        return result
+
+    def suggestions(self, lines, fresh=None):
+        """(row, suggestion) for all the paragraphs, None if some are not linted.
+
+        fresh are the suggestions just linted for some paragraphs, they are
+        cached too"""
+        fresh = fresh or {}
+        for text, suggestions in fresh.items():
+            self.put(text, suggestions)
+        result = []
+        for row, line in enumerate(lines):
+            if not line.strip():
+                continue
+            cached = fresh[line] if line in fresh else self.get(line)
+            if cached is None:
+                return None
+            result.extend((row, suggestion) for suggestion in cached)
+        return result
+
+    def refresh(self, lines, done):
+        """Lint whatever changed, a batch at a time, then count the suggestions
+        of the whole document from that one pass and call done"""
+        missing = self.missing(lines)
+        # What is linted already, in case the pass evicts it from the cache
+        fresh = self.known(lines)
+        starts = range(0, len(missing), BATCH)
+        batches = [missing[start : start + BATCH] for start in starts]
+        failed = []
+        looping = False
+
+        def store(batch, results, error):
+            if error is not None:
+                logger.warning(f"Background lint failed: {error}")
+                failed.append(error)
+                return
+            for text, suggestions in zip(batch, results):
+                self.put(text, suggestions)
+                fresh[text] = suggestions
+            if not looping:
+                # Back from the worker, go on with the next batch
+                step()
+
+        def step():
+            nonlocal looping
+            # Inline jobs (no event loop) are stored within submit, and the
+            # loop goes on; jobs in the worker go on from store instead
+            while batches and not failed:
+                batch = batches.pop(0)
+                looping = True
+                self.jobs.submit(
+                    lint_paragraphs,
+                    [batch],
+                    lambda results, error, batch=batch: store(batch, results, error),
+                )
+                looping = False
+                if self.jobs.pending():
+                    return
+            if failed:
+                return
+            self.count = len(self.suggestions(lines, fresh))
+            done()
+
+        step()
+
+    def cancel(self):
+        self.jobs.cancel()
@@ -1,4 +1,11 @@
+import os
 import re
+from collections import OrderedDict
+
+# Bytes of rendered lines kept around, roughly
+CACHE_BYTES = int(os.getenv("PIWRITE_RENDER_CACHE_BYTES", 2 * 1024 * 1024))
+# Rough bytes of a cache entry besides the text
+ENTRY_BYTES = 200
 
 
 def start_highlighter(ent, clip=0):
@@ -20,52 +27,77 @@ STARTS = {
 }
 
 
-def bolding(line, visible=True):
-    beg_of_word = re.compile(r"(^|\s)\*\*(\S)")
-    end_of_word = re.compile(r"(\S)\*\*($|\s|:|\.|\W)")
-    if visible:
-        mark = "**"
-    else:
-        mark = ""
-    new_line = re.sub(beg_of_word, f"\\1<b>{mark}\\2", line)
-    new_line = re.sub(end_of_word, f"\\1{mark}</b>\\2", new_line)
-    return new_line
-
-
-def highlighting(line, visible=True):
-    beg_of_word = re.compile(r"(^|\s)::(\S)")
-    end_of_word = re.compile(r"(\S)::($|\s|\W)")
-    if visible:
-        mark = "::"
-    else:
-        mark = ""
-    new_line = re.sub(beg_of_word, f"\\1<span class='highlight'>{mark}\\2", line)
-    new_line = re.sub(end_of_word, f"\\1{mark}</span>\\2", new_line)
-    return new_line
-
-
-def italicising(line, visible=True):
-    beg_of_word = re.compile(r"(^|\s)_(\S)")
-    end_of_word = re.compile(r"(\S)_($|\s|:|\.|\W)")
-    if visible:
-        mark = "_"
-    else:
-        mark = ""
-    new_line = re.sub(beg_of_word, f"\\1<i>{mark}\\2", line)
-    new_line = re.sub(end_of_word, f"\\1{mark}</i>\\2", new_line)
-    return new_line
-
-
-def teletyping(line, visible=True):
-    beg_of_word = re.compile(r"(^|\s)`(\S)")
-    end_of_word = re.compile(r"(\S)`($|\s|:|\.|\W)")
-    if visible:
-        mark = "`"
-    else:
-        mark = ""
-    new_line = re.sub(beg_of_word, f"\\1<tt>{mark}\\2", line)
-    new_line = re.sub(end_of_word, f"\\1{mark}</tt>\\2", new_line)
-    return new_line
+# Inline markers that can open (after a space, before something else) or close
+# (after something, before a letter that can't be part of a word)
+MARKERS = re.compile(
+    r"(?=[*:_`])(?:(?P<open>(?<!\S)(?:\*\*|::|[_`])(?=\S))"
+    r"|(?<=\S)(?:\*\*|::|[_`])(?!\w))"
+)
+TAGS = {
+    "**": ("<b>", "</b>"),
+    "_": ("<i>", "</i>"),
+    "`": ("<tt>", "</tt>"),
+    "::": ("<span class='highlight'>", "</span>"),
+}
+
+
+def inline(line, visible=True):
+    """Bold, italics, teletype and highlights, in one scan. Markers that don't
+    pair up are left as they are, and nothing is markup inside teletype"""
+    delimiters = [
+        (match.start(), match.end(), match.group(), match.lastgroup == "open")
+        for match in MARKERS.finditer(line)
+    ]
+    if not delimiters:
+        return line
+    pairs = {}
+    # Teletype first, it hides everything inside
+    opened = None
+    for idx, (_, _, marker, opens) in enumerate(delimiters):
+        if marker != "`":
+            continue
+        if opens and opened is None:
+            opened = idx
+        elif not opens and opened is not None:
+            pairs[opened] = idx
+            opened = None
+    stack = []
+    waiting = dict.fromkeys(TAGS, 0)
+    idx = 0
+    while idx < len(delimiters):
+        if idx in pairs:
+            idx = pairs[idx] + 1
+            continue
+        _, _, marker, opens = delimiters[idx]
+        if marker == "`":
+            pass
+        elif opens:
+            stack.append(idx)
+            waiting[marker] += 1
+        elif waiting[marker]:
+            # Close the latest of its kind, those opened after it stay unpaired
+            while True:
+                top = stack.pop()
+                waiting[delimiters[top][2]] -= 1
+                if delimiters[top][2] == marker:
+                    pairs[top] = idx
+                    break
+        idx += 1
+    closers = set(pairs.values())
+    result = []
+    position = 0
+    for idx, (start, end, marker, _) in enumerate(delimiters):
+        result.append(line[position:start])
+        shown = marker if visible else ""
+        if idx in pairs:
+            result.append(TAGS[marker][0] + shown)
+        elif idx in closers:
+            result.append(shown + TAGS[marker][1])
+        else:
+            result.append(marker)
+        position = end
+    result.append(line[position:])
+    return "".join(result)
 
 
 def focus(line, idx, current):
@@ -74,37 +106,70 @@ def focus(line, idx, current):
     return line
 
 
+def render(line, focused=False, visible=True):
+    """The HTML of one line"""
+    idx, current = 0, 0 if focused else -1
+    if line == "---":
+        return focus("<hr/>", idx, current)
+    if line == "":
+        return focus("""<span class="small">&nbsp;</span>""", idx, current)
+    newline = inline(line, visible)
+    for key, transform in STARTS.items():
+        if line.startswith(key):
+            return transform(newline, idx, current)
+    return focus(newline, idx, current) + "<br/>"
+
+
+class Renders:
+    """The HTML of recently rendered lines, the least recently used go first
+    once they take more than limit bytes"""
+
+    def __init__(self, limit=CACHE_BYTES):
+        self.limit = limit
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def full(self):
+        """Too full to render ahead of time, half is left for what is being edited"""
+        return self.size >= self.limit // 2
+
+    def get(self, line, visible=True):
+        key = (line, visible)
+        html = self.entries.get(key)
+        if html is None:
+            self.misses += 1
+            html = render(line, visible=visible)
+            self.entries[key] = html
+            self.size += len(line) + len(html) + ENTRY_BYTES
+            while self.size > self.limit and len(self.entries) > 1:
+                (old, _), evicted = self.entries.popitem(last=False)
+                self.size -= len(old) + len(evicted) + ENTRY_BYTES
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return html
+
+
+RENDERS = Renders()
+
+
 def markdownify(original_lines, current_line=-1, visible=True):
     """Convert simple Markdown to reasonable HTML (with some visible Markdown markers), with highlighting of the current line"""
     new_lines = []
-    skip = False
     for idx, line in enumerate(original_lines):
-        newline = line
-        if line == "---":
-            new_lines.append(focus("<hr/>", idx, current_line))
-            continue
-        if newline == "":
-            new_lines.append(
-                focus("""<span class="small">&nbsp;</span>""", idx, current_line)
-            )
-            continue
-
-        newline = bolding(newline, visible)
-        newline = italicising(newline, visible)
-        newline = teletyping(newline, visible)
-        newline = highlighting(newline, visible)
-        for key, transform in STARTS.items():
-            if line.startswith(key):
-                skip = True
-                if key == "- ":
-                    newline = transform(newline, idx, current_line)
-                else:
-                    newline = transform(newline, idx, current_line)
+        if idx == current_line:
+            # Has the caret, so it is new every key
+            new_lines.append(render(line, True, visible))
         else:
-            if not skip:
-                newline = focus(newline, idx, current_line)
-                newline = newline + "<br/>"
-            else:
-                skip = False
-        new_lines.append(newline)
+            new_lines.append(RENDERS.get(line, visible))
     return new_lines
+
+
+def warm(lines, renders=RENDERS):
+    """Render lines ahead of time, as long as there is room for them"""
+    for line in lines:
+        if renders.full():
+            return
+        renders.get(line)
@@ -0,0 +1,119 @@
+import json
+import time
+from bisect import bisect_left
+
+from piwrite.markdownify import RENDERS
+
+# Upper bounds (in seconds) of the latency buckets, from fast keys to a sluggish Pi
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+class Histogram:
+    """A Prometheus style histogram, cheap enough to observe on every key"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels=""):
+        """Exposition lines, cumulative as Prometheus expects"""
+        sep = "," if labels else ""
+        cumulative = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            result.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+        result.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        labels = f"{{{labels}}}" if labels else ""
+        result.append(f"{name}_sum{labels} {self.sum}")
+        result.append(f"{name}_count{labels} {self.count}")
+        return result
+
+
+class Metric:
+    """A family of histograms sharing name and help, one per label value"""
+
+    def __init__(self, name, help, label, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self.histograms = {}
+
+    def __getitem__(self, value):
+        if value not in self.histograms:
+            self.histograms[value] = Histogram(self.buckets)
+        return self.histograms[value]
+
+    def exposition(self):
+        result = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for value, histogram in self.histograms.items():
+            result.extend(histogram.lines(self.name, f'{self.label}="{value}"'))
+        return result
+
+
+class Counter:
+    """Counters kept elsewhere, read when exposed. read returns a dict from
+    label value to count"""
+
+    def __init__(self, name, help, label, read):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.read = read
+
+    def exposition(self):
+        result = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for value, count in self.read().items():
+            result.append(f'{self.name}{{{self.label}="{value}"}} {count}')
+        return result
+
+
+STAGES = Metric(
+    "piwrite_stage_seconds",
+    "Time spent in each stage between a key press and the browser painting it "
+    "(dispatch, render, serialize, emit including serialize, ack round trip)",
+    "stage",
+)
+KEYS_PER_FRAME = Metric(
+    "piwrite_keys_per_frame",
+    "Keys dispatched for each rendered frame",
+    "session",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+RENDER_CACHE = Counter(
+    "piwrite_render_cache_total",
+    "Lines rendered to HTML, found in the cache (hit) or not (miss)",
+    "result",
+    lambda: {"hit": RENDERS.hits, "miss": RENDERS.misses},
+)
+
+METRICS = [STAGES, KEYS_PER_FRAME, RENDER_CACHE]
+
+
+def exposition():
+    """All the metrics in Prometheus text format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.exposition())
+    return "\n".join(lines) + "\n"
+
+
+class TimedJson:
+    """The json module, timing how long socket.io spends serializing packets"""
+
+    loads = staticmethod(json.loads)
+
+    @staticmethod
+    def dumps(*args, **kwargs):
+        start = time.perf_counter()
+        result = json.dumps(*args, **kwargs)
+        STAGES["serialize"].observe(time.perf_counter() - start)
+        return result
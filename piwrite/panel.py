@@ -0,0 +1,52 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+logger = logging.getLogger("piwrite")
+
+DISPLAY = Path(__file__).parent / "display.py"
+# Folder to write PNGs to instead of drawing on the Inky, to try without one
+FAKE = os.getenv("PIWRITE_DISPLAY_FAKE")
+
+
+def display_command():
+    if FAKE:
+        return [sys.executable, str(DISPLAY), "--serve", "--fake", FAKE]
+    # display.py runs in its own virtual environment, see its shebang
+    return [str(DISPLAY), "--serve"]
+
+
+class Panel:
+    """The e-ink status display, drawn by a long lived display.py worker.
+
+    Requests are a line written to the worker's stdin, so they never block the
+    editor while the panel redraws, and the worker only draws the latest."""
+
+    def __init__(self, command):
+        self.command = command
+        self.process = None
+
+    def show(self, font, state):
+        message = json.dumps({"font": font, "state": state}) + "\n"
+        try:
+            if self.process is None or self.process.poll() is not None:
+                self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE)
+            self.process.stdin.write(message.encode("utf-8"))
+            self.process.stdin.flush()
+        except OSError as e:
+            logger.warning(f"Display not available: {e}")
+
+    def close(self, timeout=30):
+        """Let the worker finish drawing, like before shutting down"""
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"Display did not finish: {e}")
+            self.process.kill()
+        self.process = None
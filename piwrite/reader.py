@@ -0,0 +1,122 @@
+"""Reading mode (v), one page at a time.
+
+The document is split in pages of what fits on the screen at the current font
+size and rotation, and only the page shown is rendered and sent. Rendered
+pages are kept until the buffer changes, and the next one is rendered ahead
+while the writer reads."""
+import asyncio
+import math
+from bisect import bisect_right
+
+from piwrite.markdownify import markdownify
+
+# Rough size of the Kindle screen in pixels, and of a letter in points
+HEIGHT = 1100
+WIDTH = 750
+LETTER = 0.5
+
+
+def page_size(fontsize, rot="0"):
+    """(rows, letters per row) that fit on the screen"""
+    height, width = (WIDTH, HEIGHT) if rot == "90" else (HEIGHT, WIDTH)
+    fontsize = int(fontsize)
+    return int(height / (2 * fontsize)) + 2, int(width / (LETTER * 2 * fontsize))
+
+
+def paginate(lines, rows, letters):
+    """Pages as lists of paragraphs, too long paragraphs split at a space, and
+    the row of the document where each page starts"""
+    pages = []
+    starts = []
+    page = []
+    used = 0
+    for row, line in enumerate(lines):
+        pieces = [line]
+        if len(line) > rows * letters:
+            pieces = split(line, rows * letters)
+        for piece in pieces:
+            height = max(1, math.ceil(len(piece) / letters))
+            if page and used + height > rows:
+                pages.append(page)
+                page = []
+                used = 0
+            if not page:
+                starts.append(row)
+            page.append(piece)
+            used += height
+    if page or not pages:
+        pages.append(page)
+    if not starts:
+        starts.append(0)
+    return pages, starts
+
+
+def split(line, size):
+    pieces = []
+    while len(line) > size:
+        cut = line.rfind(" ", 0, size)
+        if cut <= 0:
+            cut = size
+        pieces.append(line[:cut])
+        line = line[cut:].lstrip(" ")
+    pieces.append(line)
+    return pieces
+
+
+class Reader:
+    def __init__(self):
+        self.buffer = None
+        self.version = None
+        self.size = None
+        self.pages = []
+        self.starts = []
+        self.rendered = {}
+        self.current = 0
+
+    def fresh(self, buffer, size):
+        """Whether the pages still match buffer and the page size"""
+        same = self.buffer is buffer and self.version == buffer.version
+        return same and self.size == size
+
+    def open(self, buffer, size):
+        if not self.fresh(buffer, size):
+            self.buffer = buffer
+            self.version = buffer.version
+            self.size = size
+            self.pages, self.starts = paginate(
+                [str(line) for line in buffer.lines], *size
+            )
+            self.rendered = {}
+        self.current = min(self.current, len(self.pages) - 1)
+
+    def page_of(self, row):
+        return max(0, bisect_right(self.starts, row) - 1)
+
+    def render(self, number):
+        if number not in self.rendered:
+            self.rendered[number] = markdownify(self.pages[number], visible=False)
+        return self.rendered[number]
+
+    def page(self, number):
+        """The HTML of the page, numbered from 0, and its footer"""
+        self.current = max(0, min(number, len(self.pages) - 1))
+        html = list(self.render(self.current))
+        footer = f"{self.current + 1}/{len(self.pages)}"
+        html.append(f"""<div class="page">{footer}</div>""")
+        self.prefetch(self.current + 1)
+        return html
+
+    def prefetch(self, number):
+        if number >= len(self.pages) or number in self.rendered:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        buffer, version = self.buffer, self.version
+
+        def render():
+            if self.buffer is buffer and self.version == version:
+                self.render(number)
+
+        loop.call_soon(render)
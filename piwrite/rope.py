@@ -0,0 +1,171 @@
+"""A persistent sequence (the lines of a document) kept as a balanced tree of
+small chunks. Changes return a new Rope sharing everything but the path to
+the change, so reading, inserting or deleting anywhere is O(log n) and keeping
+an old version around (for undo) is free."""
+from bisect import bisect_right
+from itertools import accumulate, islice
+
+# Items in a chunk, and children of a node
+MAX = 64
+# Smaller chunks or nodes are merged with a neighbour
+MIN = MAX // 4
+
+
+class _Node:
+    __slots__ = ("children", "size", "leaf", "ends")
+
+    def __init__(self, children, leaf, ends=None):
+        self.children = children
+        self.leaf = leaf
+        if leaf:
+            self.size = len(children)
+            return
+        # Where each child ends, to find the one holding an index by bisection
+        if ends is None:
+            ends = tuple(accumulate(child.size for child in children))
+        self.ends = ends
+        self.size = ends[-1] if ends else 0
+
+
+def _build(items):
+    half = MAX // 2
+    level = [
+        _Node(tuple(items[i : i + half]), True) for i in range(0, len(items), half)
+    ]
+    while len(level) > 1:
+        level = [
+            _Node(tuple(level[i : i + half]), False) for i in range(0, len(level), half)
+        ]
+    return level[0] if level else _Node((), True)
+
+
+def _find(node, index):
+    """The child holding index and the index within it"""
+    position = bisect_right(node.ends, index)
+    if position == len(node.ends):
+        # Past the end, only when inserting
+        position -= 1
+    return position, index - (node.ends[position - 1] if position else 0)
+
+
+def _replace(children, position, new):
+    return children[:position] + tuple(new) + children[position + 1 :]
+
+
+def _split(children, leaf):
+    if len(children) <= MAX:
+        return [_Node(children, leaf)]
+    half = len(children) // 2
+    return [_Node(children[:half], leaf), _Node(children[half:], leaf)]
+
+
+def _set(node, index, item):
+    if node.leaf:
+        return _Node(_replace(node.children, index, [item]), True)
+    position, index = _find(node, index)
+    child = _set(node.children[position], index, item)
+    return _Node(_replace(node.children, position, [child]), False, node.ends)
+
+
+def _insert(node, index, item):
+    """One node, or two when it grew too big"""
+    if node.leaf:
+        children = node.children[:index] + (item,) + node.children[index:]
+        return _split(children, True)
+    position, index = _find(node, index)
+    new = _insert(node.children[position], index, item)
+    return _split(_replace(node.children, position, new), False)
+
+
+def _delete(node, index):
+    if node.leaf:
+        return _Node(node.children[:index] + node.children[index + 1 :], True)
+    position, index = _find(node, index)
+    child = _delete(node.children[position], index)
+    children = _replace(node.children, position, [child])
+    if len(child.children) < MIN and len(children) > 1:
+        # Merge with a neighbour, splitting again if that is too big
+        left = position - 1 if position > 0 else position
+        merged = children[left].children + children[left + 1].children
+        children = (
+            children[:left] + tuple(_split(merged, child.leaf)) + children[left + 2 :]
+        )
+    return _Node(children, False)
+
+
+def _items(node, start, stop):
+    """The items from start to stop, skipping the chunks outside"""
+    if node.leaf:
+        yield from node.children[start:stop]
+        return
+    for child in node.children:
+        if start < child.size and stop > 0:
+            yield from _items(child, max(start, 0), min(stop, child.size))
+        start -= child.size
+        stop -= child.size
+        if stop <= 0:
+            return
+
+
+class Rope:
+    def __init__(self, items=()):
+        if isinstance(items, Rope):
+            items = items._root
+        self._root = items if isinstance(items, _Node) else _build(list(items))
+
+    def __len__(self):
+        return self._root.size
+
+    def __iter__(self):
+        return _items(self._root, 0, self._root.size)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                return list(self)[key]
+            return list(_items(self._root, start, stop))
+        node = self._root
+        if key < 0:
+            key += node.size
+        if not 0 <= key < node.size:
+            raise IndexError("Rope index out of range")
+        while not node.leaf:
+            position, key = _find(node, key)
+            node = node.children[position]
+        return node.children[key]
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return f"Rope({list(islice(self, 10))}{'...' if len(self) > 10 else ''})"
+
+    def _index(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Rope index out of range")
+        return index
+
+    def set(self, index, item):
+        return Rope(_set(self._root, self._index(index), item))
+
+    def insert(self, index, item):
+        index = min(max(index + len(self) if index < 0 else index, 0), len(self))
+        if not self._root.children:
+            return Rope([item])
+        nodes = _insert(self._root, index, item)
+        return Rope(nodes[0] if len(nodes) == 1 else _Node(tuple(nodes), False))
+
+    def delete(self, index):
+        root = _delete(self._root, self._index(index))
+        while not root.leaf and len(root.children) == 1:
+            root = root.children[0]
+        return Rope(root)
+
+    def append(self, item):
+        return self.insert(len(self), item)
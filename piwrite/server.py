@@ -1,8 +1,14 @@
+# Before everything else, to time all the imports when profiling startup
+from piwrite import startup  # isort: skip
+
 import asyncio
 import importlib
 import itertools
 import logging
 import os
+import re
+from pathlib import Path
+from urllib.parse import parse_qs
 
 try:
     import importlib.resources as pkg_resources
@@ -18,14 +24,29 @@ from prompt_toolkit.keys import Keys
 
 logger = logging.getLogger("piwrite")
 
-import nltk
-
+from piwrite import jobs, metrics
+from piwrite.assets import Assets
 from piwrite.editor import Editor
+from piwrite.session import Session, parse_key
 
 HOST = os.getenv("PIWRITE_HOST", "127.0.0.1")
 DEBUG = os.getenv("PIWRITE_DEBUG", "False") == "True"
 INFO = os.getenv("PIWRITE_INFO", "False") == "True"
 PORT = int(os.getenv("PIWRITE_PORT", 80))
+MAX_FPS = float(os.getenv("PIWRITE_MAX_FPS", 10))
+MAX_SESSIONS = int(os.getenv("PIWRITE_MAX_SESSIONS", 8))
+# Seconds a session nobody views is kept, so reloading the page doesn't lose it
+SESSION_GRACE = float(os.getenv("PIWRITE_SESSION_GRACE", 30))
+# Documents of the sessions, outside the /docs of the default session
+SESSIONS_DOCS = Path(
+    os.getenv("PIWRITE_SESSIONS_DOCS", Path.home() / "piwrite-sessions")
+)
+# Start the worker for :lint, Ctrl-P and :dot once the server is up
+WARM_ANALYSIS = os.getenv("PIWRITE_WARM_ANALYSIS", "True") == "True"
+# Seconds to wait for a client to acknowledge a frame before sending the next one
+ACK_TIMEOUT = 2
+# Seconds without typing before linting the changed paragraphs, 0 to disable
+LINT_IDLE = float(os.getenv("PIWRITE_LINT_IDLE", 5))
 
 STATIC_FOLDER = pkg_resources.files("piwrite") / "static"
 
@@ -51,92 +72,133 @@ def configure_logger():
     logger.addHandler(handler)
 
 
-def staticHandle(file):
-    async def handler(request):
-        return aiohttp.web.FileResponse(file)
-
-    return handler
-
-
-v = None
-sio = socketio.AsyncServer(logger=False, engineio_logger=False, async_mode="aiohttp")
+async def metrics_handler(request):
+    return aiohttp.web.Response(
+        text=metrics.exposition(), content_type="text/plain", charset="utf-8"
+    )
 
 
-def init_map():
-    update_only_map = {
-        "saved": {"sent": False, "old": None, "exec": lambda: v.saved},
-        "completions": {
-            "sent": False,
-            "old": None,
-            "exec": lambda: v.completions_markdownified,
-        },
-        "mode": {"sent": False, "old": None, "exec": lambda: v.mode()},
-        "err": {"sent": False, "old": None, "exec": lambda: v.err},
-        "filename": {"sent": False, "old": None, "exec": lambda: v.filename},
-        "command": {"sent": False, "old": None, "exec": lambda: v.command()},
-        "modal": {"sent": False, "old": None, "exec": lambda: v.modal},
-        "visual": {"sent": False, "old": None, "exec": lambda: v.visual},
-        "status": {"sent": False, "old": None, "exec": lambda: v.status},
-        "font": {"sent": False, "old": None, "exec": lambda: v.font},
-        "fontsize": {"sent": False, "old": None, "exec": lambda: v.fontsize},
-        "rot": {"sent": False, "old": None, "exec": lambda: v.rot},
-        "dot": {"sent": False, "old": None, "exec": lambda: v.dot},
-    }
-    return update_only_map
-
-
-async def the_loop():
-    key = asyncio.Event()
-    key_press = None
-    done = asyncio.Event()
+sio = socketio.AsyncServer(
+    logger=False, engineio_logger=False, async_mode="aiohttp", json=metrics.TimedJson
+)
+# The session driven by the keyboard attached to the device
+DEFAULT_SESSION = "default"
+SESSION_NAME = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+sessions: dict[str, Session] = {}
+# Session of each connected client
+clients: dict[str, Session] = {}
+
+
+def get_session(name):
+    """Get an editor session, creating it (and its folder of documents) if needed"""
+    if name in sessions:
+        return sessions[name]
+    if len(sessions) >= MAX_SESSIONS:
+        raise socketio.exceptions.ConnectionRefusedError("Too many sessions")
+    logger.warning(f"Starting session {name}")
+    # Sessions coming from the network can't touch the display nor shut down
+    docs = SESSIONS_DOCS / name
+    docs.mkdir(parents=True, exist_ok=True)
+    editor = Editor(skip_config=False, docs=docs, hardware=False)
+    editor.docs_url = f"/sessions/{name}"
+    session = Session(name, editor, sio.emit, MAX_FPS, ACK_TIMEOUT, LINT_IDLE)
+    sessions[name] = session
+    session.start()
+    return session
+
+
+def reap(name, session):
+    """Stop a session once nobody views it, freeing its place"""
+    if name == DEFAULT_SESSION or session.viewers:
+        return
+    if sessions.get(name) is not session:
+        return
+    logger.warning(f"Stopping session {name}")
+    del sessions[name]
+    session.stop()
+
+
+@sio.event
+async def connect(sid, environ):
+    query = parse_qs(environ.get("QUERY_STRING", ""))
+    name = query.get("session", [DEFAULT_SESSION])[0]
+    if SESSION_NAME.match(name) is None:
+        raise socketio.exceptions.ConnectionRefusedError("Invalid session name")
+    session = get_session(name)
+    logger.info(f"Client {sid} connected to session {name}")
+    clients[sid] = session
+    await session.connect(sid)
+
+
+@sio.event
+async def disconnect(sid):
+    logger.info(f"Client {sid} disconnected")
+    session = clients.pop(sid, None)
+    if session is not None:
+        session.disconnect(sid)
+        if not session.viewers:
+            asyncio.get_running_loop().call_later(
+                SESSION_GRACE, reap, session.name, session
+            )
+
+
+@sio.event
+async def ack(sid, version):
+    session = clients.get(sid)
+    if session is not None:
+        await session.ack(sid, version)
+
+
+@sio.event
+async def key(sid, name):
+    session = clients.get(sid)
+    # The default session only listens to the keyboard of the device
+    if session is None or session.name == DEFAULT_SESSION:
+        return
+    key_press = parse_key(name)
+    if key_press is not None:
+        session.put(key_press)
+
+
+async def the_loop(session):
+    """Feed the keys from the terminal to the default session"""
     inp = create_input()
 
-    update_only_map = init_map()
-    update_only_fields = list(update_only_map.keys())
-
     def keys_ready():
-        nonlocal key_press
-        for _key_press in itertools.chain(inp.read_keys(), inp.flush_keys()):
-            key.set()
-            key_press = _key_press
+        for key_press in itertools.chain(inp.read_keys(), inp.flush_keys()):
+            session.put(key_press)
 
     with inp.raw_mode():
         with inp.attach(keys_ready):
-            while True:
-                await key.wait()
-                logger.debug(key_press)
-                v.dispatch(key_press)
-                await sio.emit("buffer", {"data": v.get()})
-                if v.refresh:
-                    logger.info("Sending a full refresh")
-                    for field, val in update_only_map.items():
-                        await sio.emit(field, {"data": val["exec"]()})
-                    v.refresh = False
-                logger.info(f"Updating {len(v.updating_fields)} fields")
-                for field in v.updating_fields:
-                    new_val = update_only_map[field]["exec"]()
-                    await sio.emit(field, {"data": new_val})
-                v.updating_fields.clear()
-                key.clear()
-
-
-async def main():
+            await session.run()
+
+
+async def main(v):
     app = aiohttp.web.Application()
-    app.router.add_route("GET", "/", staticHandle(STATIC_FOLDER / "index.html"))
-    app.add_routes([aiohttp.web.static("/static", STATIC_FOLDER, show_index=False)])
+    with startup.step("load assets"):
+        assets = Assets(STATIC_FOLDER)
+    app.router.add_route("GET", "/", assets.page("index.html"))
+    app.router.add_route("GET", "/metrics", metrics_handler)
+    app.router.add_route("GET", "/static/{name}", assets.static)
+    session = Session(DEFAULT_SESSION, v, sio.emit, MAX_FPS, ACK_TIMEOUT, LINT_IDLE)
+    sessions[DEFAULT_SESSION] = session
     app.add_routes([aiohttp.web.static("/docs", v.docs, show_index=True)])
+    # Without an index, each session only reaches its own folder by its name
+    SESSIONS_DOCS.mkdir(parents=True, exist_ok=True)
+    app.add_routes([aiohttp.web.static("/sessions", SESSIONS_DOCS)])
     sio.attach(app)
     runner = aiohttp.web.AppRunner(app)
     await runner.setup()
     site = aiohttp.web.TCPSite(runner, host=HOST, port=PORT)
     await site.start()
     logger.warning(f"Server started at '{HOST}:{PORT}'")
-    await the_loop()
-    await asyncio.Event().wait()
+    startup.report()
+    if WARM_ANALYSIS:
+        jobs.warm()
+    await the_loop(session)
 
 
 def start():
-    global v
     configure_logger()
     if DEBUG:
         logger.setLevel(logging.DEBUG)
@@ -144,18 +206,9 @@ def start():
         logger.setLevel(logging.INFO)
     else:
         logger.setLevel(logging.WARNING)
-    try:
-        nltk.data.find("tokenizers/punkt")
-    except LookupError:
-        logger.warning("Punkt not available")
-        try:
-            # This means you need to run it at least
-            # once without access point mode
-            nltk.download("punkt")
-        except:
-            pass
-    v = Editor(skip_config=False)
-    asyncio.run(main())
+    with startup.step("editor"):
+        v = Editor(skip_config=False)
+    asyncio.run(main(v))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import time
+
+from prompt_toolkit.key_binding.key_processor import KeyPress
+from prompt_toolkit.keys import Keys
+
+from piwrite.frames import Viewer
+from piwrite.metrics import KEYS_PER_FRAME, STAGES
+
+logger = logging.getLogger("piwrite")
+
+KEY_NAMES = {key.value: key for key in Keys}
+
+
+def parse_key(name):
+    """Convert the name of a key sent by a client to a key press"""
+    if not isinstance(name, str):
+        return None
+    if name in KEY_NAMES:
+        return KeyPress(KEY_NAMES[name])
+    if len(name) == 1:
+        return KeyPress(name)
+    return None
+
+
+def init_map(v):
+    # old keeps the last value rendered, to only send the fields that changed
+    update_only_map = {
+        "saved": {"old": None, "exec": lambda: v.saved},
+        "completions": {"old": None, "exec": lambda: v.completions_markdownified},
+        "mode": {"old": None, "exec": lambda: v.mode()},
+        "err": {"old": None, "exec": lambda: v.err},
+        "filename": {"old": None, "exec": lambda: v.filename},
+        "command": {"old": None, "exec": lambda: v.command()},
+        "modal": {"old": None, "exec": lambda: v.modal},
+        "visual": {"old": None, "exec": lambda: v.visual},
+        "status": {"old": None, "exec": lambda: v.status},
+        "font": {"old": None, "exec": lambda: v.font},
+        "fontsize": {"old": None, "exec": lambda: v.fontsize},
+        "rot": {"old": None, "exec": lambda: v.rot},
+        "dot": {"old": None, "exec": lambda: v.dot},
+        "lints": {"old": None, "exec": lambda: v.lints},
+        "words": {"old": None, "exec": lambda: v.words()},
+    }
+    return update_only_map
+
+
+class Session:
+    """An editor, the clients viewing it and the loops feeding keys and frames.
+
+    emit is a coroutine function like socketio.AsyncServer.emit, used to send
+    the frames to the clients of this session."""
+
+    def __init__(self, name, editor, emit, max_fps=10, ack_timeout=2, lint_idle=5):
+        self.name = name
+        self.editor = editor
+        self.emit = emit
+        self.max_fps = max_fps
+        self.ack_timeout = ack_timeout
+        # Seconds without keys before linting in the background, 0 to never do it
+        self.lint_idle = lint_idle
+        self._idle = None
+        self.viewers = {}
+        # Last rendered frame as (version, lines, fields, keys), new clients get it straight away
+        self.latest = None
+        self.version = 0
+        # Keys dispatched so far, sent along every frame
+        self.keys = 0
+        # Histogram of how many keys were dispatched for each rendered frame
+        self.keys_per_frame = KEYS_PER_FRAME[name]
+        self.update_only_map = init_map(editor)
+        self._keys = asyncio.Queue()
+        # Set whenever keys have been dispatched and the clients need a new frame
+        self._dirty = asyncio.Event()
+        # Background analyses render their results as soon as they arrive
+        editor.jobs.notify = self._dirty.set
+        self._pending_keys = 0
+        # The one timer retrying deliver for clients that never acknowledge
+        self._retry = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        """Stop the loops and timers of a session nobody is viewing anymore"""
+        self.task.cancel()
+        for timer in [self._retry, self._idle]:
+            if timer is not None:
+                timer.cancel()
+        self._retry = self._idle = None
+        self.editor.jobs.cancel()
+        self.editor.linter.cancel()
+
+    def put(self, key_press):
+        self._keys.put_nowait(key_press)
+
+    async def run(self):
+        renderer = asyncio.create_task(self.the_renderer())
+        self.idle_later()
+        try:
+            while True:
+                # Everything that arrived while the previous frame was being
+                # sent is dispatched before rendering again, no key is dropped
+                batch = [await self._keys.get()]
+                while not self._keys.empty():
+                    batch.append(self._keys.get_nowait())
+                for key_press in batch:
+                    logger.debug(key_press)
+                    start = time.perf_counter()
+                    self.editor.dispatch(key_press)
+                    STAGES["dispatch"].observe(time.perf_counter() - start)
+                self.keys += len(batch)
+                self.idle_later()
+                self._pending_keys += len(batch)
+                self._dirty.set()
+        finally:
+            renderer.cancel()
+
+    def idle_later(self):
+        self.editor.linter.cancel()
+        if self._idle is not None:
+            self._idle.cancel()
+        if self.lint_idle:
+            self._idle = asyncio.get_running_loop().call_later(
+                self.lint_idle, self.editor.lint_idle, self._dirty.set
+            )
+
+    async def connect(self, sid):
+        viewer = Viewer()
+        self.viewers[sid] = viewer
+        if self.latest is not None:
+            viewer.offer(*self.latest)
+            # Only once the connection has been accepted
+            asyncio.create_task(self.deliver())
+
+    def disconnect(self, sid):
+        self.viewers.pop(sid, None)
+
+    async def ack(self, sid, version):
+        viewer = self.viewers.get(sid)
+        if viewer is not None:
+            if viewer.inflight is not None:
+                round_trip = asyncio.get_running_loop().time() - viewer.inflight[1]
+                STAGES["ack"].observe(round_trip)
+            viewer.ack(version)
+            if self._retry is not None:
+                self._retry.cancel()
+                self._retry = None
+            await self.deliver()
+
+    def render(self):
+        """Hand the current state of the editor to every client as its newest frame"""
+        v = self.editor
+        self.version += 1
+        if v.refresh:
+            logger.info("Sending a full refresh")
+            for viewer in self.viewers.values():
+                viewer.lines = None
+        # Comparing values is cheaper than sending them, and catches fields changed
+        # without being marked in updating_fields. Marked fields are sent anyway:
+        # command, status and err share the status line, so showing the same
+        # status again means sending it again
+        marked = set(v.updating_fields)
+        fields = {}
+        for field, val in self.update_only_map.items():
+            new_val = val["exec"]()
+            if v.refresh or field in marked or new_val != val["old"]:
+                fields[field] = new_val
+                val["old"] = new_val
+        v.refresh = False
+        v.updating_fields.clear()
+        logger.info(f"Updating {len(fields)} fields")
+        lines = v.get()
+        for viewer in self.viewers.values():
+            viewer.offer(self.version, lines, fields, self.keys)
+        self.latest = (
+            self.version,
+            lines,
+            {field: val["old"] for field, val in self.update_only_map.items()},
+            self.keys,
+        )
+
+    async def deliver(self):
+        """Send the pending frame to every client that is done with its previous one.
+
+        Clients that are at the same point get the very same payload, built once
+        and emitted once to all of them (socket.io encodes the packet only once)"""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        waiting = False
+        groups = {}
+        for sid, viewer in self.viewers.items():
+            if viewer.ready(now, self.ack_timeout):
+                groups.setdefault(viewer.group(), []).append((sid, viewer))
+            else:
+                waiting = waiting or viewer.pending is not None
+        for members in groups.values():
+            payload = members[0][1].take(now)
+            for _, viewer in members[1:]:
+                viewer.take(now, payload)
+            start = time.perf_counter()
+            await self.emit("frame", payload, to=[sid for sid, _ in members])
+            STAGES["emit"].observe(time.perf_counter() - start)
+        if waiting and self._retry is None:
+            # Don't wait forever for clients that never acknowledge
+            self._retry = loop.call_later(self.ack_timeout, self._retry_deliver)
+
+    def _retry_deliver(self):
+        self._retry = None
+        asyncio.ensure_future(self.deliver())
+
+    async def the_renderer(self):
+        """Render at most max_fps frames per second, whatever the typing speed"""
+        loop = asyncio.get_running_loop()
+        last = 0
+        # Render a first frame straight away, for the clients connecting before any key
+        self._dirty.set()
+        while True:
+            await self._dirty.wait()
+            wait = last + 1 / self.max_fps - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._dirty.clear()
+            last = loop.time()
+            self.keys_per_frame.observe(self._pending_keys)
+            logger.debug(f"Rendering {self._pending_keys} keys in one frame")
+            self._pending_keys = 0
+            try:
+                start = time.perf_counter()
+                self.render()
+                STAGES["render"].observe(time.perf_counter() - start)
+                await self.deliver()
+            except Exception as e:
+                logger.exception(f"Failed rendering frame {self.version}: {e}")
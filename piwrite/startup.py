@@ -0,0 +1,62 @@
+"""Where the time goes between launching the server and being able to type.
+
+With PIWRITE_PROFILE_STARTUP=True every first import of a module and every
+step wrapped in step() is timed, and report() logs them. Imported before
+anything else in the server, so it sees all the imports."""
+import builtins
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("piwrite")
+
+PROFILE = os.getenv("PIWRITE_PROFILE_STARTUP", "False") == "True"
+
+STARTED = time.perf_counter()
+# (name, seconds) in the order they finished
+steps: list[tuple[str, float]] = []
+
+_import = builtins.__import__
+# Imports can also happen in the thread warming up the analysis libraries
+_state = threading.local()
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    # Only time the outermost import of each new module, nested ones are included
+    if getattr(_state, "depth", 0) > 0 or level > 0 or name in sys.modules:
+        return _import(name, globals, locals, fromlist, level)
+    _state.depth = 1
+    start = time.perf_counter()
+    try:
+        return _import(name, globals, locals, fromlist, level)
+    finally:
+        _state.depth = 0
+        steps.append((f"import {name}", time.perf_counter() - start))
+
+
+if PROFILE:
+    builtins.__import__ = _timed_import
+
+
+@contextmanager
+def step(name):
+    if not PROFILE:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        steps.append((name, time.perf_counter() - start))
+
+
+def report():
+    if not PROFILE:
+        return
+    lines = [f"{1000 * seconds:9.1f}ms  {name}" for name, seconds in steps]
+    lines.append(f"{1000 * (time.perf_counter() - STARTED):9.1f}ms  total")
+    logger.warning("Startup profile:\n" + "\n".join(lines))
+    steps.clear()
@@ -2,24 +2,87 @@ window.onerror = function(e, source, lineno, colno, error){
   document.getElementById('err').innerText = e.toString() + " " + lineno + " " + error;
 }
 
+// Names of the keys as prompt_toolkit calls them
+const KEYS = {"Enter": "c-m", "Backspace": "c-h", "Escape": "escape", "Tab": "c-i",
+              "Delete": "delete", "ArrowLeft": "left", "ArrowRight": "right",
+              "ArrowUp": "up", "ArrowDown": "down"}
+
+function keyName(ev){
+  if(ev.key in KEYS){
+    return KEYS[ev.key]
+  }
+  if(!ev.key || ev.key.length != 1 || ev.altKey || ev.metaKey){
+    return null
+  }
+  if(ev.ctrlKey){
+    return "c-" + ev.key.toLowerCase()
+  }
+  return ev.key
+}
+
 function piwrite(){
-  const socket = io()
+  // Without a session this is a viewer of the keyboard plugged to the device,
+  // with one keys typed here are sent to that session
+  match = /[?&]session=([A-Za-z0-9_-]+)/.exec(window.location.search)
+  session = match ? match[1] : null
+  const socket = session ? io({query: {session: session}}) : io()
+
+  if(session){
+    document.onkeydown = function(ev){
+      pressed = keyName(ev)
+      if(pressed){
+        ev.preventDefault()
+        socket.emit('key', pressed)
+      }
+    }
+  }
+
+  // Fields are applied in this order, so the status line ends up showing the
+  // status or error over the command being typed
+  const FIELDS = ["saved", "completions", "mode", "filename", "command", "status",
+                  "err", "modal", "visual", "font", "fontsize", "rot", "dot", "lints",
+                  "words"]
+  handlers = {}
+
+  function on(name, handler){
+    handlers[name] = handler
+  }
 
   socket.on('connect', function () {
     console.log('created connection')
   });
 
-  socket.on('err', function (e) {
+  socket.on('frame', function (e) {
+    for(f=0;f<FIELDS.length;f++){
+      fieldName = FIELDS[f]
+      if(fieldName in e.fields){
+        handlers[fieldName]({data: e.fields[fieldName]})
+      }
+    }
+    handlers['buffer'](e)
+    // Let the server know it can send the next frame
+    socket.emit('ack', e.v)
+  });
+
+  on('err', function (e) {
     if(!e.data || e.data == ""){
       return
     }
     document.getElementById("status").innerHTML = e.data
   });
 
-  socket.on('completions', function (e) {
+  on('lints', function (e) {
+    document.getElementById("lints").innerHTML = e.data
+  });
+
+  on('words', function (e) {
+    document.getElementById("words").innerHTML = e.data
+  });
+
+  on('completions', function (e) {
     document.getElementById("completions").innerHTML = e.data
   });
-  socket.on('fontsize', function (e) {
+  on('fontsize', function (e) {
     if(!e.data || e.data == ""){
       return
     }
@@ -27,7 +90,7 @@ function piwrite(){
     document.getElementById("visual").style.fontSize = e.data + "pt"
   })
 
-  socket.on('dot', function (e) {
+  on('dot', function (e) {
     if(!e.data || e.data == ""){
       return
     }
@@ -59,7 +122,7 @@ function piwrite(){
     }
   }
 
-  socket.on('font', function (e) {
+  on('font', function (e) {
     if(!e.data || e.data == ""){
       return
     }
@@ -89,14 +152,14 @@ function piwrite(){
 
   rotated = false
 
-  socket.on('status', function (e) {
+  on('status', function (e) {
     if(!e.data || e.data == ""){
       return
     }
     document.getElementById("status").innerHTML = e.data
   });
 
-  socket.on('rot', function (e) {
+  on('rot', function (e) {
     if(!e.data || e.data == ""){
       return
     }
@@ -111,7 +174,7 @@ function piwrite(){
     }
   });
 
-  socket.on('visual', function (e) {  
+  on('visual', function (e) {  
     // Having to use height is one of those barfs of the Kindle browser
     if(!e.data || e.data.length == 0){
       document.getElementById("wrapper").style.height = "auto"
@@ -128,7 +191,7 @@ function piwrite(){
     }
   }); 
 
-  socket.on('modal', function (e) {
+  on('modal', function (e) {
     if(e.data == ""){
       document.getElementById("modal").style.display = "none"
       document.getElementById("modal").innerHTML = ""
@@ -140,15 +203,15 @@ function piwrite(){
     }
   });
 
-  socket.on('command', function (e) {
+  on('command', function (e) {
     document.getElementById("status").innerHTML = e.data
   });
 
-  socket.on('mode', function (e) {
+  on('mode', function (e) {
     document.getElementById("mode").innerHTML = e.data
   });
 
-  socket.on('saved', function (e) {
+  on('saved', function (e) {
     if(e.data){
       document.getElementById("saved").innerHTML = "&nbsp;"
     } else {
@@ -156,12 +219,41 @@ function piwrite(){
     }
   });
 
-  socket.on('filename', function(e) {
+  on('filename', function(e) {
     document.getElementById("filename").innerHTML = e.data
   })
 
-  socket.on('buffer', function (e) {
-    document.getElementById("field").innerHTML = e.data.join("")
+  function lineNode(html){
+    node = document.createElement("span")
+    node.className = "line"
+    node.innerHTML = html
+    return node
+  }
+
+  function patchField(field, e){
+    // Full frames come as data, incremental ones as [start, end, lines] splices
+    // over the previous lines, to be applied from the last one backwards
+    if(e.data){
+      field.innerHTML = ""
+      for(i=0;i<e.data.length;i++){
+        field.appendChild(lineNode(e.data[i]))
+      }
+      return
+    }
+    for(o=e.ops.length-1;o>=0;o--){
+      op = e.ops[o]
+      for(i=op[0];i<op[1];i++){
+        field.removeChild(field.childNodes[op[0]])
+      }
+      before = field.childNodes[op[0]] || null
+      for(i=0;i<op[2].length;i++){
+        field.insertBefore(lineNode(op[2][i]), before)
+      }
+    }
+  }
+
+  on('buffer', function (e) {
+    patchField(document.getElementById("field"), e)
     range = document.createRange()
     range.setStartBefore(document.getElementById("caret"))
     range.setEndAfter(document.getElementById("caret"))
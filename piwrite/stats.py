@@ -0,0 +1,82 @@
+"""Readability of the document from per paragraph tallies of sentences, words
+and syllables, cached by content so only edited paragraphs are counted again.
+
+Scores follow py-readability-metrics (same syllable heuristic and formulas),
+with sentences split on their final punctuation instead of by punkt."""
+import re
+
+# Entries kept beyond the paragraphs currently in the document
+CACHE_SLACK = 4096
+# Below this the scores are meaningless
+MIN_WORDS = 100
+
+WORD = re.compile(r"[^\s.,;:!?()\[\]{}\"*_#`~]+")
+SENTENCE_END = re.compile(r"[.!?]+(?=[\s\"')\]*_]|$)")
+
+
+def syllables(word):
+    word = word.lower()
+    if len(word) <= 3:
+        return 1
+    word = re.sub("(?:[^laeiouy]es|[^laeiouy]e)$", "", word)
+    word = re.sub("^y", "", word)
+    return len(re.findall("[aeiouy]{1,2}", word))
+
+
+def tally(text):
+    """(sentences, words, syllables) in a paragraph"""
+    words = [word for word in WORD.findall(text) if re.search(r"\w", word)]
+    if not words:
+        return 0, 0, 0
+    ends = list(SENTENCE_END.finditer(text))
+    sentences = len(ends)
+    # A paragraph ending without punctuation still ends its sentence
+    if not ends or WORD.search(text, ends[-1].end()):
+        sentences += 1
+    return sentences, len(words), sum(syllables(word) for word in words)
+
+
+def flesch_kincaid(sentences, words, syllables):
+    """(score, grade level)"""
+    score = 0.38 * words / sentences + 11.8 * syllables / words - 15.59
+    return score, str(round(score))
+
+
+EASE = [
+    (90, "very_easy"),
+    (80, "easy"),
+    (70, "fairly_easy"),
+    (60, "standard"),
+    (50, "fairly_difficult"),
+    (30, "difficult"),
+]
+
+
+def flesch(sentences, words, syllables):
+    """(score, ease)"""
+    score = 206.835 - 1.015 * words / sentences - 84.6 * syllables / words
+    for bound, ease in EASE:
+        if bound <= score <= 100:
+            return score, ease
+    return score, "very_confusing"
+
+
+class Stats:
+    def __init__(self):
+        self.cache = {}
+
+    def totals(self, lines):
+        """(sentences, words, syllables) of all the paragraphs"""
+        sentences = words = syllables = 0
+        for line in lines:
+            counts = self.cache.get(line)
+            if counts is None:
+                counts = self.cache[line] = tally(line)
+            sentences += counts[0]
+            words += counts[1]
+            syllables += counts[2]
+        if len(self.cache) > len(lines) + CACHE_SLACK:
+            # Forget the versions of paragraphs that are gone
+            current = set(lines)
+            self.cache = {k: v for k, v in self.cache.items() if k in current}
+        return sentences, words, syllables
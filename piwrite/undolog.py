@@ -0,0 +1,110 @@
+"""Undo across sessions. Every save appends to docs/.undo/NAME.jsonl how to go
+from the text saved to the one saved before, with a hash of the text, so
+undoing past what is in memory can keep going back one saved version at a
+time. The walk starts at the newest entry for the text and then follows the
+order of the file, so saving a text again doesn't send it round in circles.
+The file is only read the first time that happens, and when it grows too big
+its oldest entries are dropped."""
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+from piwrite.frames import apply_diff, line_diff
+
+logger = logging.getLogger("piwrite")
+
+LIMIT = int(os.getenv("PIWRITE_UNDO_LOG_BYTES", 1024 * 1024))
+FOLDER = ".undo"
+
+
+def key(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class UndoLog:
+    def __init__(self, path, limit=LIMIT):
+        self.path = Path(path)
+        self.limit = limit
+        # (hash of a saved text, operations turning it into the previous one)
+        self._entries = None
+        # Entry the next step back starts from, once walking back
+        self._next = None
+
+    @classmethod
+    def for_document(cls, docs, filename):
+        return cls(Path(docs) / FOLDER / f"{filename}.jsonl")
+
+    def record(self, old, new):
+        """Note that the text old was saved over with new"""
+        if old == new:
+            return
+        ops = line_diff(new.split("\n"), old.split("\n"))
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            entry = json.dumps({"to": key(new), "ops": ops}) + "\n"
+            if not self._complete():
+                entry = "\n" + entry
+            with self.path.open("a") as log:
+                log.write(entry)
+            if self._entries is not None:
+                self._entries.append((key(new), ops))
+            if self.path.stat().st_size > self.limit:
+                self.compact()
+        except OSError as e:
+            logger.warning(f"Could not write the undo log {self.path}: {e}")
+
+    def _complete(self):
+        """Whether the last entry was written whole"""
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return True
+        with self.path.open("rb") as log:
+            log.seek(-1, os.SEEK_END)
+            return log.read(1) == b"\n"
+
+    def compact(self):
+        """Keep the newest entries, up to half the limit (at least one)"""
+        entries = self.path.read_text().splitlines(keepends=True)
+        kept = []
+        size = 0
+        for entry in reversed(entries):
+            size += len(entry.encode("utf-8"))
+            if size > self.limit // 2 and kept:
+                break
+            kept.append(entry)
+        logger.info(f"Compacting {self.path}, keeping {len(kept)} of {len(entries)}")
+        partial = self.path.with_suffix(".tmp")
+        partial.write_text("".join(reversed(kept)))
+        partial.replace(self.path)
+        self._entries = None
+        self._next = None
+
+    def _load(self):
+        entries = []
+        if not self.path.exists():
+            return entries
+        for entry in self.path.read_text().splitlines():
+            try:
+                entry = json.loads(entry)
+            except ValueError:
+                # Cut short by a power cut
+                continue
+            entries.append((entry["to"], entry["ops"]))
+        return entries
+
+    def previous(self, lines):
+        """The lines saved before lines were, None if not known"""
+        if self._entries is None:
+            self._entries = self._load()
+        k = key("\n".join(lines))
+        if self._next is None:
+            # The first step back, from the newest time these lines were saved
+            found = [idx for idx, (to, _) in enumerate(self._entries) if to == k]
+            position = found[-1] if found else -1
+        else:
+            position = self._next
+        if position < 0 or self._entries[position][0] != k:
+            return None
+        self._next = position - 1
+        return apply_diff(list(lines), self._entries[position][1])
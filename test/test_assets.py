@@ -0,0 +1,65 @@
+import asyncio
+import gzip
+
+import pytest
+from aiohttp.test_utils import make_mocked_request
+from aiohttp.web import HTTPNotFound
+
+from piwrite.assets import IMMUTABLE, REVALIDATE, Assets
+
+CSS = "@font-face { src: url('/static/font.ttf'); }\n" * 20
+
+
+@pytest.fixture
+def assets(tmp_path):
+    (tmp_path / "font.ttf").write_bytes(b"\x00\x01" * 100)
+    (tmp_path / "index.css").write_text(CSS)
+    (tmp_path / "index.html").write_text(
+        "<link rel='stylesheet' href='/static/index.css'><img src='/static/missing.png'>"
+    )
+    return Assets(tmp_path)
+
+
+def get(handler, path, headers=None, **match_info):
+    request = make_mocked_request("GET", path, headers=headers, match_info=match_info)
+    return asyncio.run(handler(request))
+
+
+def test_urls_point_to_hashed_names(assets):
+    font, css = assets.by_name["font.ttf"], assets.by_name["index.css"]
+    assert f"/static/{font.hashed}".encode() in css.body
+    page = assets.by_name["index.html"].body.decode()
+    assert f"/static/{css.hashed}" in page
+    assert "/static/missing.png" in page
+
+
+def test_hashed_names_are_cached_forever(assets):
+    css = assets.by_name["index.css"]
+    response = get(assets.static, "/", name=css.hashed)
+    assert response.headers["Cache-Control"] == IMMUTABLE
+    assert response.headers["ETag"] == css.etag()
+    assert response.body == css.body
+
+
+def test_page_is_revalidated(assets):
+    response = get(assets.page("index.html"), "/")
+    assert response.headers["Cache-Control"] == REVALIDATE
+    again = get(
+        assets.page("index.html"), "/", {"If-None-Match": response.headers["ETag"]}
+    )
+    assert again.status == 304
+
+
+@pytest.mark.parametrize(
+    "accept,encoding", [("gzip, deflate", "gzip"), ("identity", None), ("", None)]
+)
+def test_precompressed_variants(assets, accept, encoding):
+    response = get(assets.static, "/", {"Accept-Encoding": accept}, name="index.css")
+    assert response.headers.get("Content-Encoding") == encoding
+    body = gzip.decompress(response.body) if encoding else response.body
+    assert body == assets.by_name["index.css"].body
+
+
+def test_unknown_files_are_not_found(assets):
+    with pytest.raises(HTTPNotFound):
+        get(assets.static, "/", name="nope.js")
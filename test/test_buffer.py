@@ -0,0 +1,62 @@
+import random
+
+import pytest
+from prompt_toolkit.keys import Keys
+
+from piwrite.buffer import Buffer, count_words
+from piwrite.cursor import Cursor
+from piwrite.editor import Editor
+from piwrite.line import Line
+
+
+def recount(buffer):
+    words = [count_words(line) for line in buffer.lines]
+    return sum(words), sum(1 for count in words if count > 0)
+
+
+@pytest.mark.parametrize(
+    "text,words",
+    [
+        ("", 0),
+        ("  ", 0),
+        ("One two", 2),
+        ("# Title", 1),
+        ("**bold**:and_more", 3),
+        ("  spaced   out ", 2),
+    ],
+)
+def test_count_words(text, words):
+    assert count_words(text) == words
+
+
+def test_counts_follow_random_edits():
+    generator = random.Random(16)
+    buffer = Buffer([Line("Some # text"), Line(), Line("and_more")])
+    cursor = Cursor()
+    for _ in range(3000):
+        buffer.clip(cursor)
+        choice = generator.random()
+        if choice < 0.5:
+            buffer.insert(generator.choice("ab _#:*"), cursor)
+        elif choice < 0.8:
+            buffer.delete(cursor)
+        elif choice < 0.85:
+            buffer.insert(Keys.ControlM, cursor)
+        elif choice < 0.9 and len(buffer) > 1:
+            del buffer[cursor.line]
+        else:
+            cursor.to(
+                generator.randrange(len(buffer)),
+                generator.randrange(len(buffer[cursor.line]) + 1),
+            )
+        assert buffer.counts() == recount(buffer)
+
+
+def test_editor_counts(tmp_path):
+    editor = Editor(docs=tmp_path, hardware=False)
+    editor.send(["i", "One two three", Keys.ControlM, "four", Keys.Escape])
+    assert editor.words() == "4 words"
+    editor.send(["diw"])
+    assert editor.buffer.counts() == (3, 1)
+    editor.send(["gg", "dd"])
+    assert editor.words() == "0 words"
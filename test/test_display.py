@@ -0,0 +1,39 @@
+import json
+import os
+import sys
+
+import pytest
+
+from piwrite.display import main, requests
+from piwrite.panel import Panel
+
+
+def test_requests_only_yields_the_latest_waiting():
+    read, write = os.pipe()
+    for state in ["on", "off", "on"]:
+        os.write(write, (json.dumps({"font": "mono", "state": state}) + "\n").encode())
+    reader = requests(read)
+    assert next(reader) == {"font": "mono", "state": "on"}
+    os.write(write, b'{"font": "serif", ')
+    os.write(write, b'"state": "off"}\n')
+    os.close(write)
+    assert list(reader) == [{"font": "serif", "state": "off"}]
+
+
+def test_panel_feeds_the_worker_and_waits_for_it(tmp_path):
+    out = tmp_path / "requests"
+    worker = f"import sys; open({str(out)!r}, 'w').write(sys.stdin.read())"
+    panel = Panel([sys.executable, "-c", worker])
+    panel.show("serif", "on")
+    panel.show("serif", "off")
+    panel.close()
+    lines = out.read_text().splitlines()
+    assert [json.loads(line)["state"] for line in lines] == ["on", "off"]
+
+
+def test_font_and_state_are_required_without_serve(monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["display.py", "--font", "mono"])
+    with pytest.raises(SystemExit) as exit:
+        main()
+    assert exit.value.code == 2
+    assert "--font and --state are required" in capsys.readouterr().err
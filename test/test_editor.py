@@ -1,3 +1,4 @@
+import time
 from enum import Enum
 
 import pytest
@@ -5,6 +6,8 @@ from prompt_toolkit.key_binding.key_processor import KeyPress
 from prompt_toolkit.keys import Keys
 
 import piwrite.editor as editor
+from piwrite.buffer import Buffer
+from piwrite.line import Line
 
 LETTER_I = KeyPress("i")
 ESC = Keys.Escape
@@ -319,3 +322,44 @@ def test_basic_paste():
     cmd = ["ia word", ESC, "diwa", ENT, ESC, "p"]
     v.send(cmd)
     assert str(v.buffer.get()[1]) == "word"
+
+
+def test_network_sessions_stay_in_their_docs(tmp_path):
+    docs = tmp_path / "docs"
+    v = editor.Editor(docs=docs, hardware=False)
+    outside = tmp_path / "outside"
+    v.send(["ihello", ESC, ":W ", str(outside), ENT])
+    assert not outside.exists()
+    assert v.err is not None
+    v.send([":w mine", ENT])
+    assert (docs / "mine").read_text() == "hello"
+
+
+class CountedLine(Line):
+    rendered = 0
+
+    def __repr__(self):
+        CountedLine.rendered += 1
+        return super().__repr__()
+
+
+def render_cost(lines):
+    v = editor.Editor()
+    v.buffer = Buffer([CountedLine(f"Line {idx}") for idx in range(lines)])
+    v.cursor.to(lines // 2, 0)
+    v.send(["i"])
+    CountedLine.rendered = 0
+    start = time.perf_counter()
+    for _ in range(20):
+        v.send(["x"])
+        v.get()
+    return CountedLine.rendered, time.perf_counter() - start
+
+
+def test_render_cost_does_not_grow_with_the_document():
+    _, small_time = render_cost(100)
+    count, _ = render_cost(1000)
+    big_count, big_time = render_cost(100000)
+    assert big_count == count
+    # Rendering everything would be a thousand times slower
+    assert big_time < 10 * small_time + 0.05
@@ -0,0 +1,90 @@
+import pytest
+
+from piwrite.frames import Viewer, apply_diff, line_diff
+
+
+@pytest.mark.parametrize(
+    "old,new",
+    [
+        (["a", "b", "c"], ["a", "b", "c"]),
+        (["a", "b", "c"], ["a", "B", "c"]),
+        (["a", "b", "c"], ["a", "b", "x", "c"]),
+        (["a", "b", "c"], ["a", "c"]),
+        (["a", "b", "c"], []),
+        ([], ["a", "b"]),
+        (["a", "b", "c", "d"], ["b", "c", "d", "e"]),
+        (["a", "b", "c", "d", "e"], ["x", "b", "c", "y", "e", "f"]),
+        (["a", "a", "a"], ["a", "a"]),
+    ],
+)
+def test_diff_roundtrip(old, new):
+    ops = line_diff(old, new)
+    assert apply_diff(list(old), ops) == new
+
+
+def test_single_line_change_only_sends_that_line():
+    old = [str(i) for i in range(100)]
+    new = list(old)
+    new[42] = "changed"
+    assert line_diff(old, new) == [[42, 43, ["changed"]]]
+
+
+def test_scrolling_does_not_resend_the_window():
+    old = [str(i) for i in range(50)]
+    new = old[1:] + ["50"]
+    ops = line_diff(old, new)
+    sent = sum(len(op[2]) for op in ops)
+    assert sent == 1
+    assert apply_diff(list(old), ops) == new
+
+
+def test_viewer_only_keeps_the_latest_frame():
+    viewer = Viewer()
+    viewer.offer(1, ["a"], {"mode": "N"})
+    payload = viewer.take(now=0)
+    assert payload == {"v": 1, "fields": {"mode": "N"}, "data": ["a"]}
+    # The client is still busy with frame 1
+    viewer.offer(2, ["ab"], {"mode": "I", "status": "x"})
+    viewer.offer(3, ["abc"], {"mode": "N"})
+    assert not viewer.ready(now=1, timeout=2)
+    viewer.ack(1)
+    assert viewer.ready(now=1, timeout=2)
+    payload = viewer.take(now=1)
+    assert payload == {
+        "v": 3,
+        "fields": {"mode": "N", "status": "x"},
+        "ops": [[0, 1, ["abc"]]],
+    }
+    assert not viewer.ready(now=1, timeout=2)
+
+
+def test_viewer_does_not_wait_forever_for_acks():
+    viewer = Viewer()
+    viewer.offer(1, ["a"], {})
+    viewer.take(now=0)
+    viewer.offer(2, ["b"], {})
+    assert not viewer.ready(now=1, timeout=2)
+    assert viewer.ready(now=3, timeout=2)
+
+
+def test_viewers_at_the_same_point_share_the_payload():
+    first, second, late = Viewer(), Viewer(), Viewer()
+    lines = ["a"]
+    for viewer in [first, second]:
+        viewer.offer(1, lines, {"mode": "N"})
+    payload = first.take(now=0)
+    second.take(0, payload)
+    for viewer in [first, second]:
+        viewer.ack(1)
+    late.offer(1, lines, {"mode": "N"})
+    for viewer in [first, second, late]:
+        viewer.offer(2, ["ab"], {"saved": False})
+    assert first.group() == second.group()
+    assert first.group() != late.group()
+    assert late.take(now=1)["data"] == ["ab"]
+
+
+def test_frames_say_how_many_keys_they_show():
+    viewer = Viewer()
+    viewer.offer(1, ["a"], {}, keys=3)
+    assert viewer.take(now=0)["k"] == 3
@@ -0,0 +1,46 @@
+from piwrite.buffer import Buffer
+from piwrite.cursor import Cursor
+from piwrite.history import LINE_BYTES, SNAPSHOT_BYTES, History
+from piwrite.line import Line
+
+
+def type_into(buffer, row, text):
+    cursor = Cursor(row, len(buffer[row]))
+    for letter in text:
+        buffer.insert(letter, cursor)
+
+
+def test_snapshots_cost_what_changed():
+    buffer = Buffer([Line("x" * 1000) for _ in range(100)])
+    history = History(buffer)
+    type_into(buffer, 5, "abc")
+    history.record(buffer)
+    assert history.costs[-1] == SNAPSHOT_BYTES + 1003 + LINE_BYTES
+    assert history.snapshots[1][6] is history.snapshots[0][6]
+
+
+def test_budget_forgets_the_oldest():
+    buffer = Buffer([Line("start")])
+    history = History(buffer, budget=4 * (SNAPSHOT_BYTES + LINE_BYTES + 20))
+    for step in range(10):
+        type_into(buffer, 0, str(step))
+        history.record(buffer)
+    assert len(history.snapshots) == 4
+    assert history.undo()[0][0] == "start012345678"
+    history.undo()
+    history.undo()
+    oldest, moved = history.undo()
+    assert not moved
+    assert oldest[0] == "start0123456"
+
+
+def test_redo_after_undo():
+    buffer = Buffer([Line("a")])
+    history = History(buffer)
+    type_into(buffer, 0, "b")
+    history.record(buffer)
+    previous, moved = history.undo()
+    assert moved and previous.get() == ["a"]
+    buffer, moved = history.redo()
+    assert moved and buffer[0] == "ab"
+    assert not history.redo()[1]
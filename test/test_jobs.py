@@ -0,0 +1,30 @@
+import asyncio
+
+from piwrite.jobs import Jobs, StaleJob
+
+
+def test_jobs_run_inline_without_a_loop():
+    results = []
+    Jobs().submit(len, ["abc"], lambda result, error: results.append((result, error)))
+    assert results == [(3, None)]
+
+
+def test_results_for_changed_text_are_dropped():
+    text = ["abc"]
+    results = []
+
+    async def run():
+        jobs = Jobs()
+        finished = asyncio.Event()
+        jobs.notify = finished.set
+        done = lambda result, error: results.append((result, error))
+        jobs.submit(len, [text[0]], done, check=lambda: text[0])
+        text[0] = "abcd"
+        await asyncio.wait_for(finished.wait(), 60)
+        finished.clear()
+        jobs.submit(len, [text[0]], done, check=lambda: text[0])
+        await asyncio.wait_for(finished.wait(), 60)
+
+    asyncio.run(run())
+    assert isinstance(results[0][1], StaleJob)
+    assert results[1] == (4, None)
@@ -0,0 +1,80 @@
+import pytest
+from prompt_toolkit.keys import Keys
+
+import piwrite.editor as editor
+from piwrite.keymap import Keymap
+
+
+def test_prefixes_wait_for_the_rest():
+    keymap = Keymap()
+    keymap.add("diw", "delete")
+    keymap.add([Keys.ControlS], "counts")
+    assert keymap.find("di").command is None
+    assert keymap.find("diw").command == "delete"
+    assert keymap.find([Keys.ControlS]).command == "counts"
+    assert keymap.find("dx") is None
+
+
+def test_no_rebinding():
+    keymap = Keymap()
+    keymap.add("gg", "top")
+    with pytest.raises(ValueError):
+        keymap.add("gg", "other")
+
+
+@pytest.mark.parametrize(
+    "keys,command",
+    [
+        (["d"], "d"),
+        (["d", "i"], "di"),
+        (["d", "x"], ""),
+        (["g", "x"], ""),
+        ([":fs 2"], ":fs 2"),
+        ([":nope", Keys.ControlM], ""),
+        ([":w foo", Keys.ControlI], ""),
+    ],
+)
+def test_pending_commands(keys, command):
+    v = editor.Editor()
+    v.send(keys)
+    assert v.command() == command
+
+
+@pytest.mark.parametrize(
+    "line,fontsize,viz",
+    [
+        (":fs 20", 20, None),
+        (":fontsize 9", 9, None),
+        (":viz 30:15", 12, (30, 15)),
+        (":viz nope", 12, None),
+    ],
+)
+def test_ex_commands(line, fontsize, viz):
+    v = editor.Editor()
+    v.send([line, Keys.ControlM])
+    assert (v.fontsize, v.viz) == (fontsize, viz)
+    assert v.command() == ""
+
+
+def test_new_commands():
+    v = editor.Editor()
+    v.dispatcher.bind("zz", lambda: v.send(["A!", Keys.Escape]))
+    v.dispatcher.ex_command("twice", lambda arg: v.send(["i", arg * 2, Keys.Escape]))
+    v.send([":twice ab", Keys.ControlM, "z", "z"])
+    assert str(v.buffer[0]) == "abab!"
+
+
+@pytest.mark.parametrize("command", [":wq", ":x"])
+def test_write_and_quit(tmp_path, command):
+    v = editor.Editor(docs=tmp_path, hardware=False)
+    v.send(["ifirst", Keys.Escape, ":w doc", Keys.ControlM, "A!", Keys.Escape])
+    v.send([command, Keys.ControlM])
+    assert (tmp_path / "doc").read_text() == "first!"
+    assert v.saved
+    assert v.status == "Only the device itself can shut down"
+
+
+def test_unknown_ex_commands():
+    v = editor.Editor()
+    v.send([":nope 1", Keys.ControlM])
+    assert v.err == "Unknown command :nope"
@@ -0,0 +1,44 @@
+import random
+
+import pytest
+
+from piwrite.line import Line
+
+
+def test_edits_match_plain_strings():
+    generator = random.Random(17)
+    line = Line("Some words to start with")
+    text = str(line)
+    column = len(text)
+    for _ in range(5000):
+        choice = generator.random()
+        if choice < 0.5:
+            letter = generator.choice(["a", " ", "é", "xyz"])
+            line.insert(column, letter)
+            text = text[0:column] + letter + text[column:]
+            column += len(letter)
+        elif choice < 0.8:
+            if column > 0:
+                line.delete(column)
+                text = text[0 : column - 1] + text[column:]
+                column -= 1
+        elif choice < 0.9:
+            column = generator.randrange(len(text) + 1)
+        else:
+            assert str(line) == text
+        assert len(line) == len(text)
+        if text:
+            index = generator.randrange(-len(text), len(text))
+            assert line[index] == text[index]
+    assert line == text
+
+
+@pytest.mark.parametrize(
+    "column,expected", [(2, "abXYcd"), (0, "XYabcd"), (4, "abcdXY")]
+)
+def test_insert(column, expected):
+    line = Line("abcd")
+    line.insert(column, "X")
+    line.insert(column + 1, "Y")
+    assert line == expected
+    assert line.copy() == expected
@@ -0,0 +1,64 @@
+from prompt_toolkit.keys import Keys
+
+from piwrite.editor import Editor
+from piwrite.linter import Linter
+
+
+def test_cache_evicts_the_least_recently_used():
+    linter = Linter(size=2)
+    linter.put("a", [])
+    linter.put("b", [])
+    linter.get("a")
+    linter.put("c", [])
+    assert linter.missing(["a", "b", "c", "", "b"]) == ["b"]
+
+
+def test_linters_share_the_cache():
+    first, second = Linter(), Linter()
+    first.put("A paragraph both sessions have.", [("fake",)])
+    assert second.missing(["A paragraph both sessions have."]) == []
+    assert Linter(size=10).missing(["A paragraph both sessions have."]) != []
+
+
+def test_suggestions_need_every_paragraph():
+    linter = Linter()
+    linter.put("a", [("x",)])
+    assert linter.suggestions(["a", "", "b"]) is None
+    assert linter.suggestions(["a", "", "b"], {"b": []}) == [(0, ("x",))]
+    assert linter.get("b") == []
+
+
+def test_refresh_only_lints_what_changed():
+    linter = Linter()
+    linter.put("Already linted.", [("fake",)])
+    linter.refresh(["Already linted.", "", "It is very unique."], lambda: None)
+    assert linter.get("It is very unique.")
+    assert linter.count == 1 + len(linter.get("It is very unique."))
+    assert linter.missing(["Already linted.", "It is very unique."]) == []
+
+
+def test_documents_bigger_than_the_cache(tmp_path):
+    paragraphs = [f"Paragraph {idx}." for idx in range(40)]
+    linter = Linter(size=20)
+    for text in paragraphs[:10]:
+        linter.put(text, [("fake",)])
+    linter.refresh(paragraphs, lambda: None)
+    assert linter.count == 10
+    assert linter.missing(paragraphs) == []
+    editor = Editor(docs=tmp_path, hardware=False)
+    editor.linter = Linter(size=20)
+    typed = ["i"]
+    for text in paragraphs:
+        typed.extend([text, Keys.ControlM])
+    editor.send(typed + [Keys.Escape, ":lint", Keys.ControlM])
+    assert editor.modal.startswith("No suggestions")
+    assert editor.linter.count == 0
+
+
+def test_lint_uses_the_cache(tmp_path):
+    editor = Editor(docs=tmp_path, hardware=False)
+    editor.send(["i", "Fine.", Keys.Escape])
+    editor.linter.put("Fine.", [(None, "cached", None, 3)])
+    editor.send([":lint", Keys.ControlM])
+    assert editor.modal == "At 0:3: cached"
+    assert editor.lints == "1 lint"
@@ -1,6 +1,6 @@
 import pytest
 
-from piwrite.markdownify import markdownify
+from piwrite.markdownify import ENTRY_BYTES, Renders, inline, markdownify, warm
 
 
 @pytest.mark.parametrize(
@@ -139,3 +139,42 @@ def test_tt_hidden(text, converted):
 )
 def test_escaped_underscore(text, converted):
     assert markdownify([text])[0] == converted
+
+
+@pytest.mark.parametrize(
+    "text,converted",
+    [
+        ("`a_b_c`", "<tt>a_b_c</tt>"),
+        ("`_foo_` _bar_", "<tt>_foo_</tt> <i>bar</i>"),
+        ("**a** **b**", "<b>a</b> <b>b</b>"),
+        ("**unclosed and _closed_", "**unclosed and <i>closed</i>"),
+        ("_a **b_ c**", "<i>a **b</i> c**"),
+        ("::note:: here", "<span class='highlight'>note</span> here"),
+        ("snake_case_name", "snake_case_name"),
+    ],
+)
+def test_inline(text, converted):
+    assert inline(text, visible=False) == converted
+
+
+def test_renders_are_cached():
+    renders = Renders()
+    assert renders.get("**a** b") == "<b>**a**</b> b<br/>"
+    assert renders.get("**a** b") == "<b>**a**</b> b<br/>"
+    assert renders.get("**a** b", visible=False) == "<b>a</b> b<br/>"
+    assert (renders.hits, renders.misses) == (1, 2)
+
+
+def test_renders_evict_the_least_recently_used():
+    renders = Renders(limit=3 * (ENTRY_BYTES + 20))
+    for line in ["a", "b", "c", "a", "d"]:
+        renders.get(line)
+    assert list(renders.entries) == [("c", True), ("a", True), ("d", True)]
+    assert renders.size <= renders.limit
+
+
+def test_warm_stops_when_full():
+    renders = Renders(limit=10 * ENTRY_BYTES)
+    warm((f"line {idx}" for idx in range(1000)), renders)
+    assert renders.full()
+    assert len(renders.entries) < 6
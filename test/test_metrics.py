@@ -0,0 +1,45 @@
+import json
+
+from piwrite.metrics import Counter, Histogram, Metric, TimedJson
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(1, 2, 4))
+    for value in [0.5, 1, 1.5, 3, 10]:
+        histogram.observe(value)
+    assert histogram.lines("x") == [
+        'x_bucket{le="1"} 2',
+        'x_bucket{le="2"} 3',
+        'x_bucket{le="4"} 4',
+        'x_bucket{le="+Inf"} 5',
+        "x_sum 16.0",
+        "x_count 5",
+    ]
+
+
+def test_exposition_format():
+    metric = Metric("piwrite_test_seconds", "A test", "stage", buckets=(1,))
+    metric["dispatch"].observe(0.5)
+    assert metric.exposition() == [
+        "# HELP piwrite_test_seconds A test",
+        "# TYPE piwrite_test_seconds histogram",
+        'piwrite_test_seconds_bucket{stage="dispatch",le="1"} 1',
+        'piwrite_test_seconds_bucket{stage="dispatch",le="+Inf"} 1',
+        'piwrite_test_seconds_sum{stage="dispatch"} 0.5',
+        'piwrite_test_seconds_count{stage="dispatch"} 1',
+    ]
+
+
+def test_timed_json_is_json():
+    data = {"a": [1, "b"]}
+    assert TimedJson.dumps(data) == json.dumps(data)
+    assert TimedJson.loads(TimedJson.dumps(data)) == data
+
+
+def test_counter_exposition():
+    counter = Counter("piwrite_test_total", "A test", "result", lambda: {"hit": 3})
+    assert counter.exposition() == [
+        "# HELP piwrite_test_total A test",
+        "# TYPE piwrite_test_total counter",
+        'piwrite_test_total{result="hit"} 3',
+    ]
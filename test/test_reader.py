@@ -0,0 +1,66 @@
+import pytest
+from prompt_toolkit.keys import Keys
+
+import piwrite.editor as editor
+from piwrite.buffer import Buffer
+from piwrite.line import Line
+from piwrite.reader import Reader, paginate, split
+
+
+@pytest.mark.parametrize(
+    "lines,pages,starts",
+    [
+        ([], [[]], [0]),
+        (["a", "b", "c"], [["a", "b"], ["c"]], [0, 2]),
+        (["aaaaaaa", "b"], [["aaaaaaa"], ["b"]], [0, 1]),
+        (
+            ["aaa aaa aaa aaa aaa", "b"],
+            [["aaa aaa"], ["aaa aaa"], ["aaa", "b"]],
+            [0, 0, 0],
+        ),
+    ],
+)
+def test_paginate(lines, pages, starts):
+    assert paginate(lines, 2, 4) == (pages, starts)
+
+
+def test_split_without_spaces():
+    assert split("abcdefg", 3) == ["abc", "def", "g"]
+
+
+def test_pages_are_rendered_once_until_an_edit():
+    buffer = Buffer([Line(f"**line** {idx}") for idx in range(10)])
+    reader = Reader()
+    reader.open(buffer, (4, 40))
+    assert reader.page(1)[0] == "<b>line</b> 4<br/>"
+    assert list(reader.rendered) == [1]
+    reader.open(buffer, (4, 40))
+    assert list(reader.rendered) == [1]
+    buffer[4] = Line("changed")
+    reader.open(buffer, (4, 40))
+    assert reader.rendered == {}
+    assert reader.page(1)[0] == "changed<br/>"
+
+
+def test_page_turning():
+    v = editor.Editor()
+    v.buffer = Buffer([Line(f"Line {idx}") for idx in range(200)])
+    v.cursor.to(100, 0)
+    v.send(["v"])
+    pages = len(v.reader.pages)
+    first = v.reader.current
+    assert first == v.reader.page_of(100)
+    assert v.visual[-1] == f"""<div class="page">{first + 1}/{pages}</div>"""
+    v.send([" ", " ", "b"])
+    assert v.reader.current == first + 1
+    v.send([Keys.Left, Keys.Left])
+    assert v.reader.current == first - 1
+    v.send(["q"])
+    assert v.visual == ""
+    assert v.cursor.line == 100
+
+
+def test_page_keys_are_typed_in_insert_mode():
+    v = editor.Editor()
+    v.send(["v", "a", " x", Keys.Escape])
+    assert v.buffer.get() == [" x"]
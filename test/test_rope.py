@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+from piwrite.buffer import Buffer
+from piwrite.cursor import Cursor
+from piwrite.line import Line
+from piwrite.rope import Rope
+
+
+def depth(rope):
+    node, result = rope._root, 1
+    while not node.leaf:
+        node, result = node.children[0], result + 1
+    return result
+
+
+@pytest.mark.parametrize("size", [0, 1, 63, 64, 65, 5000])
+def test_edits_match_lists(size):
+    generator = random.Random(size)
+    items = list(range(size))
+    rope = Rope(items)
+    for step in range(3000):
+        choice = generator.random()
+        if choice < 0.45 or not items:
+            index = generator.randint(0, len(items))
+            items.insert(index, -step)
+            rope = rope.insert(index, -step)
+        elif choice < 0.9:
+            index = generator.randrange(len(items))
+            del items[index]
+            rope = rope.delete(index)
+        else:
+            index = generator.randrange(len(items))
+            items[index] = step
+            rope = rope.set(index, step)
+        assert len(rope) == len(items)
+    assert list(rope) == items
+    assert rope == items
+    assert rope[3:70] == items[3:70]
+    if items:
+        assert rope[-1] == items[-1]
+    assert depth(rope) <= 4
+
+
+def test_changes_leave_old_versions_alone():
+    old = Rope(range(1000))
+    new = old.delete(500).insert(0, "x").set(999, "y")
+    assert list(old) == list(range(1000))
+    assert new[0] == "x" and new[501] == 501 and new[999] == "y"
+
+
+def test_buffer_copies_share_unchanged_lines():
+    buffer = Buffer([Line("one"), Line("two")])
+    snapshot = buffer.copy()
+    cursor = Cursor(1, 3)
+    buffer.insert("s", cursor)
+    buffer.insert("!", cursor)
+    assert snapshot.get() == ["one", "two"]
+    assert buffer.get() == ["one", "twos!"]
+    assert buffer[0] is snapshot[0]
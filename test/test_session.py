@@ -0,0 +1,73 @@
+import asyncio
+
+from prompt_toolkit.keys import Keys
+
+import piwrite.editor as editor
+import piwrite.server as server
+from piwrite.session import Session
+
+
+def test_one_retry_for_clients_that_do_not_ack():
+    async def run():
+        sent = []
+
+        async def emit(event, payload, to):
+            sent.append(payload)
+
+        session = Session("test", editor.Editor(), emit, ack_timeout=0.05)
+        await session.connect("slow")
+        for _ in range(5):
+            session.render()
+            await session.deliver()
+        retry = session._retry
+        assert retry is not None
+        await session.deliver()
+        assert session._retry is retry
+        await session.ack("slow", session.version - 1)
+        assert retry.cancelled()
+
+    asyncio.run(run())
+
+
+def test_saving_twice_shows_the_status_twice(tmp_path):
+    async def run():
+        sent = []
+
+        async def emit(event, payload, to):
+            sent.append(payload)
+
+        v = editor.Editor(docs=tmp_path, hardware=False)
+        session = Session("test", v, emit)
+        await session.connect("client")
+        statuses = []
+        for _ in range(2):
+            v.send([":w f", Keys.ControlM])
+            session.render()
+            await session.deliver()
+            await session.ack("client", session.version)
+            statuses.append(sent[-1]["fields"].get("status"))
+        return statuses
+
+    assert asyncio.run(run()) == ["Saved as f", "Saved as f"]
+
+
+def test_sessions_stop_once_nobody_views_them(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "SESSIONS_DOCS", tmp_path)
+    monkeypatch.setattr(server, "SESSION_GRACE", 0.01)
+
+    async def run():
+        environ = {"QUERY_STRING": "session=mine"}
+        await server.connect("first", environ)
+        session = server.sessions["mine"]
+        assert session.editor.docs == tmp_path / "mine"
+        await server.disconnect("first")
+        # Back before the grace period is over, like reloading the page
+        await server.connect("second", environ)
+        await asyncio.sleep(0.05)
+        assert server.sessions["mine"] is session
+        await server.disconnect("second")
+        await asyncio.sleep(0.05)
+        assert "mine" not in server.sessions
+        assert session.task.done()
+
+    asyncio.run(run())
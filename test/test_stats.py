@@ -0,0 +1,43 @@
+import pytest
+
+from piwrite.stats import Stats, flesch, flesch_kincaid, syllables, tally
+
+
+@pytest.mark.parametrize(
+    "word,expected", [("the", 1), ("readability", 5), ("paragraph", 3), ("make", 1)]
+)
+def test_syllables(word, expected):
+    assert syllables(word) == expected
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("", (0, 0, 0)),
+        ("One sentence here.", (1, 3, 4)),
+        ("Two. Sentences!", (2, 2, 3)),
+        ("No final stop", (1, 3, 4)),
+        ("**Bold** claim: yes", (1, 3, 3)),
+    ],
+)
+def test_tally(text, expected):
+    assert tally(text) == expected
+
+
+def test_scores():
+    assert flesch_kincaid(10, 100, 150) == pytest.approx((5.91, "6"), abs=0.01)
+    score, ease = flesch(10, 100, 150)
+    assert score == pytest.approx(69.785)
+    assert ease == "standard"
+
+
+def test_totals_only_count_new_paragraphs(monkeypatch):
+    stats = Stats()
+    lines = ["A first one.", "", "A second one."]
+    assert stats.totals(lines) == (2, 6, 7)
+    counted = []
+    monkeypatch.setattr(
+        "piwrite.stats.tally", lambda text: counted.append(text) or (1, 1, 1)
+    )
+    assert stats.totals(lines[:2] + ["Changed."]) == (2, 4, 4)
+    assert counted == ["Changed."]
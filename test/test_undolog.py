@@ -0,0 +1,68 @@
+from prompt_toolkit.keys import Keys
+
+from piwrite.editor import Editor
+from piwrite.undolog import UndoLog
+
+ESC = Keys.Escape
+ENT = Keys.ControlM
+
+
+def test_undo_goes_back_through_saved_versions(tmp_path):
+    v = Editor(docs=tmp_path, hardware=False)
+    v.send(["ifirst", ESC, ":w doc", ENT, "A second", ESC, ":w", ENT])
+    v.send(["A third", ESC, ":w", ENT])
+    # A new session, like after a restart
+    w = Editor(docs=tmp_path, hardware=False)
+    w.send([":e doc", ENT])
+    assert w.buffer.get() == ["first second third"]
+    w.send(["u"])
+    assert w.buffer.get() == ["first second"]
+    w.send(["u"])
+    assert w.buffer.get() == ["first"]
+    w.send(["u"])
+    assert w.buffer.get() == [""]
+    w.send(["u"])
+    assert w.status == "No further undo information"
+    w.send([Keys.ControlR, Keys.ControlR])
+    assert w.buffer.get() == ["first second"]
+
+
+def test_unknown_text_has_no_previous(tmp_path):
+    log = UndoLog(tmp_path / "log.jsonl")
+    log.record("a", "a\nb")
+    assert log.previous(["a", "b"]) == ["a"]
+    assert log.previous(["a", "c"]) is None
+
+
+def test_compaction_keeps_the_newest(tmp_path):
+    log = UndoLog(tmp_path / "log.jsonl", limit=2000)
+    for step in range(100):
+        log.record(f"version {step}", f"version {step + 1}")
+    assert (tmp_path / "log.jsonl").stat().st_size <= 2000
+    fresh = UndoLog(tmp_path / "log.jsonl")
+    assert fresh.previous(["version 100"]) == ["version 99"]
+    assert fresh.previous(["version 1"]) is None
+
+
+def test_cut_short_entries_are_skipped(tmp_path):
+    log = UndoLog(tmp_path / "log.jsonl")
+    log.record("a", "b")
+    with (tmp_path / "log.jsonl").open("a") as f:
+        f.write('{"to": "')
+    log.record("b", "c")
+    assert UndoLog(tmp_path / "log.jsonl").previous(["b"]) == ["a"]
+    assert UndoLog(tmp_path / "log.jsonl").previous(["c"]) == ["b"]
+
+
+def test_saving_a_text_again_does_not_loop(tmp_path):
+    v = Editor(docs=tmp_path, hardware=False)
+    v.send(["iA", ESC, ":w doc", ENT, "ddiB", ESC, ":w", ENT, "ddiA", ESC, ":w", ENT])
+    w = Editor(docs=tmp_path, hardware=False)
+    w.send([":e doc", ENT])
+    seen = []
+    for _ in range(6):
+        w.send(["u"])
+        seen.append(w.buffer.get())
+    assert seen == [["B"], ["A"], [""], [""], [""], [""]]
+    assert w.status == "No further undo information"
+    assert len(w.history.snapshots) == 4